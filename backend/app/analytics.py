@@ -0,0 +1,147 @@
+"""标注统计
+
+统计已审核通过（REVIEWED）任务的打标结果，结果保存在汇总表中（见 models 中的 OptionStat 等），
+统计接口直接读取汇总表，不需要导出全部打标记录：
+- 各题目选项被选择的次数：在数据库中展开 selected_options（SQLite json_each / PostgreSQL jsonb_array_elements_text）后聚合
+- 各打标员已审核通过的任务数
+- 每首音乐的打标一致率：各题多数答案占比的平均值（同一首音乐分配给多个打标员时才有意义）
+
+任务审核通过时在同一事务中增量累加，删除已审核通过的任务 / 音乐 / 题目时扣减，
+rebuild_analytics 根据全部已审核通过的任务重建（迁移时回填，或通过 rebuild-analytics 命令修复）。
+"""
+import json
+from collections import Counter, defaultdict
+from sqlalchemy import and_, delete, func, insert, select, true, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app.models import MusicAgreementStat, MusicAnswerStat, OptionStat, TaggerStat, TaggingRecord, TaggingTask
+from app.schemas import TaggingStatusEnum
+
+# 重建时每批处理的音乐数量
+REBUILD_BATCH_SIZE = 1000
+
+
+def answer_key(selected_options: list[str] | None) -> str:
+    """答案的统一表示：排序后的选项列表 JSON（多选题的选择顺序不影响一致性）"""
+    return json.dumps(sorted(selected_options or []), ensure_ascii=False)
+
+
+def selected_option_values(db: Session):
+    """将 selected_options 展开为每个选项一行的表值函数（列 value）"""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.jsonb_array_elements_text(TaggingRecord.selected_options).table_valued("value")
+    return func.json_each(TaggingRecord.selected_options).table_valued("value")
+
+
+def upsert_increment(db: Session, model, rows: list[dict], count_column: str):
+    """按主键累加计数列，不存在时插入，累加后计数不大于 0 的行删除"""
+    if not rows:
+        return
+    table = model.__table__
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(table)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=list(table.primary_key.columns),
+            set_={count_column: table.c[count_column] + stmt.excluded[count_column]}
+        ),
+        rows
+    )
+    if any(row[count_column] < 0 for row in rows):
+        key_columns = list(table.primary_key.columns)
+        keys = [tuple(row[column.name] for column in key_columns) for row in rows]
+        db.execute(delete(table).where(tuple_(*key_columns).in_(keys), table.c[count_column] <= 0))
+
+
+def refresh_music_agreement(db: Session, music_ids: set[int]):
+    """根据 analytics_music_answers 重新计算这些音乐的一致率"""
+    if not music_ids:
+        return
+    music_ids = list(music_ids)
+    db.execute(delete(MusicAgreementStat).where(MusicAgreementStat.music_id.in_(music_ids)))
+    # music_id -> question_id -> 各答案的任务数
+    counts = defaultdict(lambda: defaultdict(list))
+    for music_id, question_id, task_count in db.execute(
+        select(MusicAnswerStat.music_id, MusicAnswerStat.question_id, MusicAnswerStat.task_count)
+        .where(MusicAnswerStat.music_id.in_(music_ids))
+    ):
+        counts[music_id][question_id].append(task_count)
+    rows = []
+    for music_id, questions in counts.items():
+        agreements = [max(answer_counts) / sum(answer_counts) for answer_counts in questions.values()]
+        rows.append({
+            "music_id": music_id,
+            "tagger_count": max(sum(answer_counts) for answer_counts in questions.values()),
+            "agreement": sum(agreements) / len(agreements)
+        })
+    if rows:
+        db.execute(insert(MusicAgreementStat), rows)
+
+
+def update_analytics(db: Session, condition, sign: int):
+    """将满足 condition 的已审核通过任务计入（sign=1）或移出（sign=-1）汇总表
+
+    在任务状态已写入数据库（flush）之后、打标记录删除之前调用，随调用方事务提交
+    """
+    reviewed = and_(TaggingTask.status == TaggingStatusEnum.REVIEWED, condition)
+
+    values = selected_option_values(db)
+    option_rows = db.execute(
+        select(TaggingRecord.question_id, values.c.value, func.count())
+        .select_from(TaggingRecord)
+        .join(TaggingTask, TaggingTask.id == TaggingRecord.task_id)
+        .join(values, true())
+        .where(reviewed)
+        .group_by(TaggingRecord.question_id, values.c.value)
+    ).all()
+    upsert_increment(db, OptionStat, [
+        {"question_id": question_id, "option": option, "selected_count": sign * count}
+        for question_id, option, count in option_rows
+    ], "selected_count")
+
+    tagger_rows = db.execute(
+        select(TaggingTask.tagger_id, func.count()).where(reviewed).group_by(TaggingTask.tagger_id)
+    ).all()
+    upsert_increment(db, TaggerStat, [
+        {"tagger_id": tagger_id, "reviewed_count": sign * count}
+        for tagger_id, count in tagger_rows
+    ], "reviewed_count")
+
+    answers = Counter(
+        (music_id, question_id, answer_key(selected_options))
+        for music_id, question_id, selected_options in db.execute(
+            select(TaggingTask.music_id, TaggingRecord.question_id, TaggingRecord.selected_options)
+            .join(TaggingTask, TaggingTask.id == TaggingRecord.task_id)
+            .where(reviewed)
+        )
+    )
+    upsert_increment(db, MusicAnswerStat, [
+        {"music_id": music_id, "question_id": question_id, "answer": answer, "task_count": sign * count}
+        for (music_id, question_id, answer), count in answers.items()
+    ], "task_count")
+    refresh_music_agreement(db, {music_id for music_id, _, _ in answers})
+
+
+def remove_question_analytics(db: Session, question_id: int):
+    """删除题目时移除该题目的统计，并重新计算相关音乐的一致率"""
+    music_ids = set(db.execute(
+        select(MusicAnswerStat.music_id).where(MusicAnswerStat.question_id == question_id).distinct()
+    ).scalars())
+    db.execute(delete(OptionStat).where(OptionStat.question_id == question_id))
+    db.execute(delete(MusicAnswerStat).where(MusicAnswerStat.question_id == question_id))
+    refresh_music_agreement(db, music_ids)
+
+
+def rebuild_analytics(db: Session) -> int:
+    """清空汇总表并根据全部已审核通过的任务按音乐分批重建，返回统计的音乐数量（不提交事务）"""
+    for model in (OptionStat, TaggerStat, MusicAnswerStat, MusicAgreementStat):
+        db.execute(delete(model))
+    music_ids = db.execute(
+        select(TaggingTask.music_id)
+        .where(TaggingTask.status == TaggingStatusEnum.REVIEWED)
+        .distinct()
+        .order_by(TaggingTask.music_id)
+    ).scalars().all()
+    for start in range(0, len(music_ids), REBUILD_BATCH_SIZE):
+        update_analytics(db, TaggingTask.music_id.in_(music_ids[start:start + REBUILD_BATCH_SIZE]), 1)
+    return len(music_ids)
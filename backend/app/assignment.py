@@ -0,0 +1,43 @@
+"""批量分配打标任务时的人员分配策略"""
+import heapq
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models import TaggingTask
+from app.schemas import AssignPolicyEnum, TaggingStatusEnum
+
+
+def count_open_tasks(db: Session, user_column, user_ids: list[int]) -> dict[int, int]:
+    """一次分组查询统计各用户未审核通过的任务数（作为当前负载）"""
+    rows = db.query(user_column, func.count(TaggingTask.id)).filter(
+        user_column.in_(user_ids),
+        TaggingTask.status != TaggingStatusEnum.REVIEWED
+    ).group_by(user_column).all()
+    return {user_id: count for user_id, count in rows}
+
+
+def make_picker(user_ids: list[int], policy: AssignPolicyEnum, loads: dict[int, int] | None = None):
+    """按分配策略生成选人函数 pick(n)，每次返回 n 个不同的用户ID
+
+    - ROUND_ROBIN: 按顺序轮流分配
+    - LEAST_LOADED: 每次选择当前负载最小的用户，负载相同按 user_ids 中的顺序
+    """
+    if policy == AssignPolicyEnum.LEAST_LOADED:
+        loads = loads or {}
+        heap = [(loads.get(user_id, 0), index, user_id) for index, user_id in enumerate(user_ids)]
+        heapq.heapify(heap)
+
+        def pick_least_loaded(n: int) -> list[int]:
+            picked = [heapq.heappop(heap) for _ in range(n)]
+            for load, index, user_id in picked:
+                heapq.heappush(heap, (load + 1, index, user_id))
+            return [user_id for _, _, user_id in picked]
+        return pick_least_loaded
+
+    position = 0
+
+    def pick_round_robin(n: int) -> list[int]:
+        nonlocal position
+        picked = [user_ids[(position + i) % len(user_ids)] for i in range(n)]
+        position = (position + n) % len(user_ids)
+        return picked
+    return pick_round_robin
@@ -0,0 +1,258 @@
+"""音频元数据解析
+
+只读取文件头部：WAV 解析 RIFF 的 fmt / data 块，MP3 解析首个帧头（以及 Xing/Info/VBRI 帧数信息），
+得到时长、采样率、声道数和码率，不解码音频数据。
+导入时文件状态在线程池中并发获取，音频头解析在进程池中执行，结果保存在 music 表中。
+"""
+import multiprocessing
+import os
+import struct
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from app.config import settings
+
+# MP3 首帧查找范围（ID3v2 标签之后）
+MP3_SYNC_SEARCH_SIZE = 64 * 1024
+
+# MPEG 版本位：3=MPEG1, 2=MPEG2, 0=MPEG2.5
+MP3_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    0: (11025, 12000, 8000),
+}
+# 码率表（kbps），键为 (是否 MPEG1, 层)，层位：3=Layer I, 2=Layer II, 1=Layer III
+MP3_BITRATES = {
+    (True, 3): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 1): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 3): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 1): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+
+def parse_wav(f, file_size: int) -> dict:
+    """解析 WAV 文件的 fmt 与 data 块"""
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return {}
+    channels = sample_rate = byte_rate = data_size = None
+    while True:
+        chunk_header = f.read(8)
+        if len(chunk_header) < 8:
+            break
+        chunk_id, chunk_size = chunk_header[:4], struct.unpack("<I", chunk_header[4:])[0]
+        if chunk_id == b"fmt ":
+            fmt = f.read(chunk_size)
+            if len(fmt) < 16:
+                return {}
+            _, channels, sample_rate, byte_rate = struct.unpack("<HHII", fmt[:12])
+            if chunk_size % 2:
+                f.seek(1, os.SEEK_CUR)
+        elif chunk_id == b"data":
+            # 流式写出的文件 data 块大小可能为占位值，以实际文件大小为上限
+            data_size = min(chunk_size, file_size - f.tell())
+            break
+        else:
+            f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+    if not sample_rate or not byte_rate:
+        return {}
+    metadata = {"sample_rate": sample_rate, "channels": channels, "bitrate": byte_rate * 8}
+    if data_size is not None:
+        metadata["duration"] = data_size / byte_rate
+    return metadata
+
+
+def parse_mp3_frame_header(data: bytes, pos: int) -> dict | None:
+    """解析 pos 处的 MPEG 音频帧头，不是有效帧头时返回 None"""
+    if pos + 4 > len(data) or data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+    version = (data[pos + 1] >> 3) & 0x03
+    layer = (data[pos + 1] >> 1) & 0x03
+    bitrate_index = data[pos + 2] >> 4
+    sample_rate_index = (data[pos + 2] >> 2) & 0x03
+    if version == 1 or layer == 0 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    mpeg1 = version == 3
+    bitrate = MP3_BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version][sample_rate_index]
+    padding = (data[pos + 2] >> 1) & 0x01
+    channels = 1 if data[pos + 3] >> 6 == 3 else 2
+    if layer == 3:
+        samples_per_frame = 384
+        frame_length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples_per_frame = 1152 if layer == 2 or mpeg1 else 576
+        frame_length = samples_per_frame // 8 * bitrate // sample_rate + padding
+    return {
+        "mpeg1": mpeg1,
+        "layer": layer,
+        "bitrate": bitrate,
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "samples_per_frame": samples_per_frame,
+        "frame_length": frame_length,
+    }
+
+
+def read_vbr_frame_count(data: bytes, pos: int, frame: dict) -> int | None:
+    """读取首帧中 Xing/Info 或 VBRI 头记录的总帧数"""
+    if frame["layer"] == 1:
+        if frame["mpeg1"]:
+            side_info_size = 17 if frame["channels"] == 1 else 32
+        else:
+            side_info_size = 9 if frame["channels"] == 1 else 17
+        xing_pos = pos + 4 + side_info_size
+        if data[xing_pos:xing_pos + 4] in (b"Xing", b"Info") and len(data) >= xing_pos + 12:
+            flags = struct.unpack(">I", data[xing_pos + 4:xing_pos + 8])[0]
+            if flags & 0x01:
+                return struct.unpack(">I", data[xing_pos + 8:xing_pos + 12])[0]
+    vbri_pos = pos + 4 + 32
+    if data[vbri_pos:vbri_pos + 4] == b"VBRI" and len(data) >= vbri_pos + 18:
+        return struct.unpack(">I", data[vbri_pos + 14:vbri_pos + 18])[0]
+    return None
+
+
+def parse_mp3(f, file_size: int) -> dict:
+    """解析 MP3 文件：跳过 ID3v2 标签，查找首个有效帧头
+
+    - 有 Xing/Info/VBRI 帧数信息时按帧数计算时长（VBR），码率为平均码率
+    - 否则按首帧码率估算时长（CBR）
+    """
+    audio_start = 0
+    header = f.read(10)
+    if len(header) == 10 and header[:3] == b"ID3":
+        tag_size = (header[6] & 0x7F) << 21 | (header[7] & 0x7F) << 14 | (header[8] & 0x7F) << 7 | (header[9] & 0x7F)
+        audio_start = 10 + tag_size + (10 if header[5] & 0x10 else 0)
+    f.seek(audio_start)
+    data = f.read(MP3_SYNC_SEARCH_SIZE)
+
+    pos = data.find(b"\xff")
+    while pos != -1:
+        frame = parse_mp3_frame_header(data, pos)
+        if frame:
+            # 下一帧也在缓冲区内时校验帧同步，避免误判
+            next_pos = pos + frame["frame_length"]
+            if next_pos + 4 > len(data) or parse_mp3_frame_header(data, next_pos):
+                break
+        pos = data.find(b"\xff", pos + 1)
+    else:
+        return {}
+
+    audio_size = file_size - audio_start - pos
+    metadata = {"sample_rate": frame["sample_rate"], "channels": frame["channels"], "bitrate": frame["bitrate"]}
+    frame_count = read_vbr_frame_count(data, pos, frame)
+    if frame_count:
+        duration = frame_count * frame["samples_per_frame"] / frame["sample_rate"]
+        metadata["duration"] = duration
+        metadata["bitrate"] = int(audio_size * 8 / duration)
+    else:
+        metadata["duration"] = audio_size * 8 / frame["bitrate"]
+    return metadata
+
+
+AUDIO_PARSERS = {
+    ".wav": parse_wav,
+    ".mp3": parse_mp3,
+}
+
+
+def stat_file(path: str) -> os.stat_result | None:
+    """获取文件状态，文件不存在或无法访问时返回 None"""
+    try:
+        return os.stat(path)
+    except OSError:
+        return None
+
+
+def parse_audio_header(path: str, file_size: int) -> dict:
+    """解析音频头，得到 duration / sample_rate / channels / bitrate（无法解析的项为 None）"""
+    metadata = {"duration": None, "sample_rate": None, "channels": None, "bitrate": None}
+    parser = AUDIO_PARSERS.get(os.path.splitext(path)[1].lower())
+    if parser:
+        try:
+            with open(path, "rb") as f:
+                metadata.update(parser(f, file_size))
+        except (OSError, struct.error, ZeroDivisionError):
+            pass
+    return metadata
+
+
+def read_audio_metadata(path: str) -> dict | None:
+    """读取音频文件的大小、修改时间与音频参数
+
+    - 文件不存在或无法访问时返回 None
+    - 音频头无法解析时 duration / sample_rate / channels / bitrate 为 None
+    """
+    stat_result = stat_file(path)
+    if stat_result is None:
+        return None
+    return {
+        "file_size": stat_result.st_size,
+        "file_mtime": stat_result.st_mtime,
+        **parse_audio_header(path, stat_result.st_size)
+    }
+
+
+# 并发获取文件状态的有界线程池（网络存储上 stat 的延迟远大于 CPU 开销）
+_io_executor = ThreadPoolExecutor(max_workers=settings.INGEST_IO_WORKERS, thread_name_prefix="ingest-io")
+# 解析音频头的进程池，首次使用时创建并在进程内复用（见 get_metadata_executor）
+_metadata_executor: ProcessPoolExecutor | None = None
+_metadata_executor_lock = threading.Lock()
+
+
+def get_metadata_executor() -> ProcessPoolExecutor:
+    """获取解析音频头的进程池
+
+    服务进程中有多个线程，fork 出的子进程可能继承其他线程持有的锁，
+    因此使用 forkserver（不支持时使用 spawn）启动子进程
+    """
+    global _metadata_executor
+    with _metadata_executor_lock:
+        if _metadata_executor is None:
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _metadata_executor = ProcessPoolExecutor(
+                max_workers=settings.INGEST_METADATA_WORKERS,
+                mp_context=multiprocessing.get_context(method)
+            )
+        return _metadata_executor
+
+
+def shutdown_metadata_executor():
+    """关闭解析音频头的进程池（应用退出时调用，之后再次使用会重新创建）"""
+    global _metadata_executor
+    with _metadata_executor_lock:
+        if _metadata_executor is not None:
+            _metadata_executor.shutdown(cancel_futures=True)
+            _metadata_executor = None
+
+
+def stat_files(paths: list[str]) -> list[os.stat_result | None]:
+    """在线程池中并发获取文件状态，结果与 paths 顺序一致"""
+    return list(_io_executor.map(stat_file, paths))
+
+
+def read_audio_metadata_batch(paths: list[str]) -> list[dict | None]:
+    """批量读取音频元数据，结果与 paths 顺序一致
+
+    文件状态在线程池中并发获取（不存在的文件为 None），只有音频头解析在进程池中执行
+    """
+    if not paths:
+        return []
+    stat_results = stat_files(paths)
+    existing = [(path, stat_result) for path, stat_result in zip(paths, stat_results) if stat_result is not None]
+    chunksize = max(1, len(existing) // (settings.INGEST_METADATA_WORKERS * 4))
+    headers = iter(get_metadata_executor().map(
+        parse_audio_header,
+        [path for path, _ in existing],
+        [stat_result.st_size for _, stat_result in existing],
+        chunksize=chunksize
+    ))
+    return [
+        None if stat_result is None else {
+            "file_size": stat_result.st_size,
+            "file_mtime": stat_result.st_mtime,
+            **next(headers)
+        }
+        for stat_result in stat_results
+    ]
@@ -1,4 +1,7 @@
 import jwt
+import threading
+import time
+from collections import OrderedDict
 from fastapi import Depends
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
@@ -10,19 +13,63 @@ from app.models import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/users/login")
 
+# 已验证用户缓存：token -> (过期时间, 用户)，按最近使用顺序淘汰
+_principal_cache: OrderedDict[str, tuple[float, User]] = OrderedDict()
+_principal_cache_lock = threading.Lock()
+
+def get_cached_principal(token: str) -> User | None:
+    """从缓存获取 token 对应的用户，过期返回 None"""
+    with _principal_cache_lock:
+        cached = _principal_cache.get(token)
+        if cached is None:
+            return None
+        expire_at, user = cached
+        if expire_at <= time.time():
+            del _principal_cache[token]
+            return None
+        _principal_cache.move_to_end(token)
+        return user
+
+def cache_principal(token: str, user: User, token_expire_at: float | None):
+    """缓存 token 对应的用户（脱离会话的副本），有效期不超过 token 本身的过期时间"""
+    expire_at = time.time() + settings.PRINCIPAL_CACHE_TTL_SECONDS
+    if token_expire_at is not None:
+        expire_at = min(expire_at, token_expire_at)
+    principal = User(id=user.id, username=user.username, role=user.role, create_time=user.create_time)
+    with _principal_cache_lock:
+        _principal_cache[token] = (expire_at, principal)
+        _principal_cache.move_to_end(token)
+        while len(_principal_cache) > settings.PRINCIPAL_CACHE_MAX_SIZE:
+            _principal_cache.popitem(last=False)
+
+def invalidate_principal_cache(user_id: int | None = None):
+    """失效已验证用户缓存，用户信息或角色变更时调用
+    - user_id 为 None 时清空全部缓存
+    """
+    with _principal_cache_lock:
+        if user_id is None:
+            _principal_cache.clear()
+            return
+        for token in [token for token, (_, user) in _principal_cache.items() if user.id == user_id]:
+            del _principal_cache[token]
+
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """获取当前用户"""
+    """获取当前用户（优先使用缓存，命中时不访问数据库）"""
+    user = get_cached_principal(token)
+    if user is not None:
+        return user
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id = payload.get("data")
-        if user_id is None:
-            raise BizException("无效的 token")
-        user = db.query(User).filter(User.id == user_id).first()
-        if user is None:
-            raise BizException("用户不存在")
-        return user
-    except jwt.JWTError:
+    except jwt.InvalidTokenError:
+        raise BizException("无效的 token")
+    user_id = payload.get("data")
+    if user_id is None:
         raise BizException("无效的 token")
+    user = db.query(User).filter(User.id == user_id).first()
+    if user is None:
+        raise BizException("用户不存在")
+    cache_principal(token, user, payload.get("exp"))
+    return user
 
 def create_access_token(user_id: int):
     """创建访问令牌"""
@@ -30,4 +77,4 @@ def create_access_token(user_id: int):
         "data": user_id,
         "exp": datetime.now(timezone.utc) + timedelta(seconds=settings.ACCESS_TOKEN_EXPIRE_SECONDS)
     }
-    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
\ No newline at end of file
+    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
@@ -0,0 +1,308 @@
+"""基准测试
+
+ingest-latency：测量大批量导入期间其他请求的响应延迟，用于确认阻塞操作没有占用事件循环。
+需要服务端与本脚本在同一台机器上（导入的音频文件由本脚本在临时目录中生成），建议使用单独的测试数据库。
+    python -m app.benchmark ingest-latency --username admin --password xxx [--base-url http://127.0.0.1:8000] [--files 20000]
+    1. 基线：以 --concurrency 个并发持续请求音乐列表 --duration 秒，统计延迟
+    2. 导入期间：通过 /music/ingest 导入 --files 个文件，同时以相同并发请求音乐列表，统计延迟
+
+sqlite-writes：在临时 SQLite 数据库上对比默认设置与性能参数（SQLITE_TUNING）下的并发写入吞吐量。
+    python -m app.benchmark sqlite-writes [--writers 8] [--readers 4] [--duration 5]
+
+serialization：在临时 SQLite 数据库上测量大列表响应（不分页的音乐列表、打标任务列表）的大小与耗时，进程内直接调用接口。
+    python -m app.benchmark serialization [--music 10000] [--tasks 100] [--questions 15] [--repeat 10]
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+import wave
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import func, insert, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from app.config import settings
+from app.database import Base, create_db_engine, get_db
+from app.models import Music, TaggingQuestion, TaggingRecord, TaggingTask, User
+from app.routers import api_router
+from app.schemas import TaggingStatusEnum, UserRoleEnum
+
+# 生成的测试音频：单声道 8kHz 16 位，0.1 秒静音
+WAV_FRAMES = b"\0\0" * 800
+
+
+def create_wav_files(directory: str, count: int) -> list[str]:
+    """在目录中生成 count 个小 WAV 文件"""
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"bench_{i:07d}.wav")
+        with wave.open(path, "wb") as f:
+            f.setnchannels(1)
+            f.setsampwidth(2)
+            f.setframerate(8000)
+            f.writeframes(WAV_FRAMES)
+        paths.append(path)
+    return paths
+
+
+def percentile(values: list[float], p: float) -> float:
+    """计算百分位数（最近秩）"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def format_latencies(latencies: list[float]) -> str:
+    """格式化延迟统计（毫秒）"""
+    if not latencies:
+        return "无请求"
+    return (
+        f"{len(latencies)} 次请求，"
+        f"p50 {percentile(latencies, 0.5) * 1000:.1f}ms，"
+        f"p95 {percentile(latencies, 0.95) * 1000:.1f}ms，"
+        f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms，"
+        f"最大 {max(latencies) * 1000:.1f}ms"
+    )
+
+
+def run_load(base_url: str, headers: dict, concurrency: int, stop: threading.Event) -> list[float]:
+    """以 concurrency 个线程持续请求音乐列表，直到 stop 被设置，返回所有请求的延迟（秒）"""
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def worker():
+        with httpx.Client(base_url=base_url, headers=headers, timeout=60) as client:
+            while not stop.is_set():
+                start = time.perf_counter()
+                client.get("/music/", params={"page": 1, "page_size": 20}).raise_for_status()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies
+
+
+def bench_ingest_latency(args):
+    """导入期间并发请求延迟"""
+    with httpx.Client(base_url=args.base_url, timeout=60) as client:
+        token = client.post("/user/login", json={"username": args.username, "password": args.password}).json()["data"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    with tempfile.TemporaryDirectory(prefix="music_bench_") as directory:
+        print(f"生成 {args.files} 个测试文件...")
+        paths = create_wav_files(directory, args.files)
+        manifest = "".join(path + "\n" for path in paths).encode("utf-8")
+
+        stop = threading.Event()
+        timer = threading.Timer(args.duration, stop.set)
+        timer.start()
+        baseline = run_load(args.base_url, headers, args.concurrency, stop)
+        print(f"基线：{format_latencies(baseline)}")
+
+        stop = threading.Event()
+        ingest_result = {}
+
+        def ingest():
+            start = time.perf_counter()
+            try:
+                with httpx.Client(base_url=args.base_url, headers=headers, timeout=None) as client:
+                    response = client.post("/music/ingest", files={"file": ("manifest.jsonl", manifest)})
+                    ingest_result["summary"] = response.text.strip().splitlines()[-1]
+            finally:
+                ingest_result["elapsed"] = time.perf_counter() - start
+                stop.set()
+
+        ingest_thread = threading.Thread(target=ingest)
+        ingest_thread.start()
+        during_ingest = run_load(args.base_url, headers, args.concurrency, stop)
+        ingest_thread.join()
+
+    print(f"导入期间：{format_latencies(during_ingest)}")
+    print(f"导入耗时 {ingest_result['elapsed']:.1f}s，结果：{ingest_result.get('summary')}")
+
+
+def run_sqlite_workload(database_url: str, writers: int, readers: int, duration: float) -> dict:
+    """writers 个线程各自循环执行单行更新并提交，readers 个线程循环执行统计查询，持续 duration 秒"""
+    engine = create_db_engine(database_url)
+    Session = sessionmaker(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with Session() as db:
+        db.execute(insert(Music), [{"filepath": f"/bench/{i}.wav", "filename": str(i)} for i in range(1000)])
+        db.commit()
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    result = {"commits": 0, "locked_errors": 0, "read_latencies": []}
+
+    def writer(index: int):
+        music_id = index
+        with Session() as db:
+            while not stop.is_set():
+                music_id = (music_id + writers) % 1000 + 1
+                try:
+                    db.execute(
+                        update(Music).where(Music.id == music_id).values(valid_tagging_count=Music.valid_tagging_count + 1)
+                    )
+                    db.commit()
+                except OperationalError:
+                    db.rollback()
+                    with lock:
+                        result["locked_errors"] += 1
+                    continue
+                with lock:
+                    result["commits"] += 1
+
+    def reader():
+        with Session() as db:
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    db.query(func.sum(Music.valid_tagging_count)).scalar()
+                    db.commit()
+                except OperationalError:
+                    db.rollback()
+                    continue
+                with lock:
+                    result["read_latencies"].append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    engine.dispose()
+    return result
+
+
+def bench_sqlite_writes(args):
+    """对比默认设置与性能参数下的 SQLite 并发写入吞吐量"""
+    for tuning in (False, True):
+        settings.SQLITE_TUNING = tuning
+        with tempfile.TemporaryDirectory(prefix="music_bench_") as directory:
+            result = run_sqlite_workload(
+                f"sqlite:///{os.path.join(directory, 'bench.db')}", args.writers, args.readers, args.duration
+            )
+        print(
+            f"{'性能参数' if tuning else '默认设置'}：写入 {result['commits'] / args.duration:.0f} 次提交/秒，"
+            f"database is locked {result['locked_errors']} 次；读取 {format_latencies(result['read_latencies'])}"
+        )
+
+
+def create_serialization_data(Session, music_count: int, task_count: int, question_count: int):
+    """生成音乐、用户、题目，并为前 task_count 首音乐各创建一个包含所有题目的已打标任务"""
+    with Session() as db:
+        db.execute(insert(Music), [
+            {
+                "filepath": f"/bench/album_{i // 20:05d}/track_{i:07d}.wav",
+                "filename": f"track_{i:07d}.wav",
+                "file_size": 10_000_000 + i,
+                "duration": 180.0,
+                "sample_rate": 44100,
+                "channels": 2,
+                "bitrate": 1411
+            }
+            for i in range(music_count)
+        ])
+        users = [User(username=f"bench_{role.value}", password="", role=role) for role in UserRoleEnum]
+        questions = [
+            TaggingQuestion(
+                title=f"题目 {i}",
+                description="根据音乐内容选择最符合的选项",
+                is_multiple_choice=True,
+                options=[f"选项 {j}" for j in range(8)]
+            )
+            for i in range(question_count)
+        ]
+        db.add_all(users + questions)
+        db.flush()
+        tagger, reviewer, admin = users
+        for music_id in range(1, min(task_count, music_count) + 1):
+            task = TaggingTask(
+                music_id=music_id,
+                status=TaggingStatusEnum.TAGGED,
+                tagger_id=tagger.id,
+                reviewer_id=reviewer.id,
+                creator_id=admin.id
+            )
+            task.records = [TaggingRecord(question_id=question.id, selected_options=question.options[:2]) for question in questions]
+            db.add(task)
+        db.commit()
+
+
+def bench_serialization(args):
+    """大列表响应的大小与耗时"""
+    with tempfile.TemporaryDirectory(prefix="music_bench_") as directory:
+        engine = create_db_engine(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        Session = sessionmaker(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        create_serialization_data(Session, args.music, args.tasks, args.questions)
+
+        def get_bench_db():
+            with Session() as db:
+                yield db
+
+        app = FastAPI(default_response_class=ORJSONResponse)
+        app.include_router(api_router)
+        app.dependency_overrides[get_db] = get_bench_db
+        cases = [
+            (f"音乐列表（{args.music} 首，不分页）", "/music/", {}),
+            (f"打标任务列表（{args.tasks} 个任务 × {args.questions} 题）", "/tagging/task/list", {"page_size": args.tasks}),
+            ("打标任务列表 view=compact", "/tagging/task/list", {"page_size": args.tasks, "view": "compact"}),
+        ]
+        with TestClient(app) as client:
+            for name, path, params in cases:
+                client.get(path, params=params).raise_for_status()
+                latencies = []
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    response = client.get(path, params=params)
+                    latencies.append(time.perf_counter() - start)
+                print(f"{name}：{len(response.content) / 1024:.0f} KiB，{format_latencies(latencies)}")
+        engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = subparsers.add_parser("ingest-latency", help="导入期间并发请求延迟")
+    ingest_parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    ingest_parser.add_argument("--username", required=True, help="管理员用户名")
+    ingest_parser.add_argument("--password", required=True)
+    ingest_parser.add_argument("--files", type=int, default=20000, help="导入的文件数量")
+    ingest_parser.add_argument("--concurrency", type=int, default=8, help="并发请求数")
+    ingest_parser.add_argument("--duration", type=float, default=5, help="基线测试时长（秒）")
+
+    sqlite_parser = subparsers.add_parser("sqlite-writes", help="SQLite 并发写入吞吐量")
+    sqlite_parser.add_argument("--writers", type=int, default=8, help="写入线程数")
+    sqlite_parser.add_argument("--readers", type=int, default=4, help="读取线程数")
+    sqlite_parser.add_argument("--duration", type=float, default=5, help="每种设置的测试时长（秒）")
+
+    serialization_parser = subparsers.add_parser("serialization", help="大列表响应的序列化耗时")
+    serialization_parser.add_argument("--music", type=int, default=10000, help="音乐数量")
+    serialization_parser.add_argument("--tasks", type=int, default=100, help="打标任务数量（即任务列表每页数量，不超过 100）")
+    serialization_parser.add_argument("--questions", type=int, default=15, help="每个任务的题目数量")
+    serialization_parser.add_argument("--repeat", type=int, default=10, help="每个接口的请求次数")
+
+    args = parser.parse_args()
+    if args.command == "ingest-latency":
+        bench_ingest_latency(args)
+    elif args.command == "sqlite-writes":
+        bench_sqlite_writes(args)
+    else:
+        bench_serialization(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""运维命令
+
+用法：python -m app.commands <command>
+- migrate: 执行数据库版本迁移
+- repair-valid-tagging-count: 回填/修复音乐的有效打标数
+- rebuild-analytics: 根据已审核通过的任务重建标注统计汇总表
+- scan-music [--full]: 扫描 MUSIC_SCAN_ROOTS 导入新音乐文件，更新已变化文件的元数据（默认增量扫描，--full 可发现原地修改的文件）
+- refresh-music-metadata [--all]: 读取音频元数据（默认只处理尚无元数据的音乐）
+- reset-export-jobs: 将服务异常退出时遗留的执行中导出任务重置为等待执行（需先停止服务，下次启动时重新执行）
+"""
+import argparse
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+from app.database import Base, SessionLocal, engine
+from app.models import Music, TaggingTask
+from app.analytics import rebuild_analytics
+from app.config import settings
+from app.audio_metadata import read_audio_metadata_batch
+from app.export_jobs import reset_running_export_jobs
+from app.ingest import iter_scan
+from app.migrations import run_migrations
+from app.schemas import TaggingStatusEnum
+
+
+def repair_valid_tagging_count(db: Session) -> int:
+    """根据已审核通过的任务重新计算所有音乐的有效打标数，返回被修正的音乐数量"""
+    reviewed_count = select(func.count(TaggingTask.id)).where(
+        TaggingTask.music_id == Music.id,
+        TaggingTask.status == TaggingStatusEnum.REVIEWED
+    ).scalar_subquery()
+    result = db.execute(
+        update(Music)
+        .where(or_(Music.valid_tagging_count.is_(None), Music.valid_tagging_count != reviewed_count))
+        .values(valid_tagging_count=reviewed_count)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+def refresh_music_metadata(db: Session, refresh_all: bool = False):
+    """按 id 分批读取音乐文件的音频元数据并批量更新，逐批返回 (处理数量, 更新数量)
+
+    - refresh_all 为 False 时只处理尚无元数据的音乐；文件不存在的音乐保持不变
+    """
+    query = db.query(Music.id, Music.filepath)
+    if not refresh_all:
+        query = query.filter(Music.file_size.is_(None))
+    last_id = 0
+    while True:
+        batch = query.filter(Music.id > last_id).order_by(Music.id.asc()).limit(settings.INGEST_BATCH_SIZE).all()
+        if not batch:
+            return
+        last_id = batch[-1].id
+        metadata_list = read_audio_metadata_batch([music.filepath for music in batch])
+        rows = [
+            {"id": music.id, **metadata}
+            for music, metadata in zip(batch, metadata_list)
+            if metadata is not None
+        ]
+        if rows:
+            db.execute(update(Music), rows)
+        db.commit()
+        yield len(batch), len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="音乐打标平台运维命令")
+    parser.add_argument("command", choices=["migrate", "repair-valid-tagging-count", "rebuild-analytics", "scan-music", "refresh-music-metadata", "reset-export-jobs"])
+    parser.add_argument("--full", action="store_true", help="scan-music 时全量扫描")
+    parser.add_argument("--all", action="store_true", help="refresh-music-metadata 时重新读取所有音乐")
+    args = parser.parse_args()
+
+    # 与服务启动时一致：创建缺失的表并执行版本迁移
+    Base.metadata.create_all(bind=engine)
+    applied_versions = run_migrations(engine)
+
+    if args.command == "migrate":
+        print(f"已执行迁移版本: {applied_versions}" if applied_versions else "数据库已是最新版本")
+    elif args.command == "repair-valid-tagging-count":
+        db = SessionLocal()
+        try:
+            repaired = repair_valid_tagging_count(db)
+        finally:
+            db.close()
+        print(f"已修正 {repaired} 首音乐的有效打标数")
+    elif args.command == "rebuild-analytics":
+        db = SessionLocal()
+        try:
+            music_count = rebuild_analytics(db)
+            db.commit()
+        finally:
+            db.close()
+        print(f"已重建标注统计，共 {music_count} 首音乐")
+    elif args.command == "scan-music":
+        db = SessionLocal()
+        try:
+            success_count = updated_count = missing_count = 0
+            for batch_result in iter_scan(db, settings.MUSIC_SCAN_ROOTS, args.full):
+                success_count += batch_result["success_count"]
+                updated_count += batch_result["updated_count"]
+                missing_count += batch_result["missing_count"]
+                print(
+                    f"已扫描 {batch_result['scanned_directories']} 个目录，新增 {batch_result['success_count']} 首音乐，"
+                    f"更新 {batch_result['updated_count']} 首，{batch_result['missing_count']} 首文件已不存在"
+                )
+                for path in batch_result["missing_paths"]:
+                    print(f"文件已不存在: {path}")
+        finally:
+            db.close()
+        print(f"扫描完成，共新增 {success_count} 首音乐，更新 {updated_count} 首，{missing_count} 首文件已不存在")
+    elif args.command == "refresh-music-metadata":
+        db = SessionLocal()
+        try:
+            total_count = updated_count = 0
+            for batch_count, batch_updated in refresh_music_metadata(db, args.all):
+                total_count += batch_count
+                updated_count += batch_updated
+                print(f"已处理 {total_count} 首音乐")
+        finally:
+            db.close()
+        print(f"元数据读取完成，共更新 {updated_count} 首音乐，{total_count - updated_count} 首文件不存在")
+    elif args.command == "reset-export-jobs":
+        db = SessionLocal()
+        try:
+            reset_count = reset_running_export_jobs(db)
+        finally:
+            db.close()
+        print(f"已重置 {reset_count} 个执行中的导出任务")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,81 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, make_url, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """为每个新建的 SQLite 连接设置性能参数
+
+    - WAL 模式下读写互不阻塞，synchronous=NORMAL 时提交不再每次 fsync（仅检查点时 fsync，断电可能丢失最近的提交但不会损坏数据库）
+    - busy_timeout 使写锁冲突时等待而不是立即报 database is locked
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    # 负数表示以 KiB 为单位
+    cursor.execute(f"PRAGMA cache_size={-settings.SQLITE_CACHE_SIZE_KB}")
+    cursor.close()
+
+
+def create_db_engine(database_url: str):
+    """根据配置创建数据库引擎
+
+    - 连接池大小需不小于线程池中可能同时访问数据库的线程数，否则请求会排队等待连接
+    - SQLite 文件数据库启用 SQLITE_TUNING 时在每个连接上设置性能参数
+    - 其他数据库（PostgreSQL）启用连接存活检测与定期回收，PostgreSQL 在连接上设置语句超时
+    """
+    backend_name = make_url(database_url).get_backend_name()
+    is_sqlite = backend_name == "sqlite"
+    options = {}
+    if is_sqlite:
+        options["connect_args"] = {"check_same_thread": False}
+    else:
+        options.update(
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    if backend_name == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+        options["connect_args"] = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+    # 内存数据库使用单连接池，不支持连接池大小配置
+    if not (is_sqlite and ":memory:" in database_url):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+        )
+    db_engine = create_engine(database_url, **options)
+    if is_sqlite and settings.SQLITE_TUNING:
+        event.listen(db_engine, "connect", set_sqlite_pragmas)
+    return db_engine
+
+
+def create_pg_extensions(connection):
+    """PostgreSQL 中创建可用的扩展（pg_trgm：LIKE '%关键字%' 搜索的三元组索引）"""
+    if connection.dialect.name != "postgresql":
+        return
+    available = connection.execute(
+        text("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    ).first()
+    if available:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+
+def pg_trgm_installed(ddl, target, bind, **kw) -> bool:
+    """三元组索引的创建条件：PostgreSQL 且已安装 pg_trgm 扩展"""
+    if bind.dialect.name != "postgresql":
+        return False
+    return bind.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
+
+engine = create_db_engine(settings.DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+# 建表前创建所需的数据库扩展
+event.listen(Base.metadata, "before_create", lambda target, connection, **kw: create_pg_extensions(connection))
 
 def get_db():
     """数据库会话依赖"""
@@ -0,0 +1,280 @@
+"""打标记录流式导出
+
+按批次分页查询音乐及其符合条件（默认已审核通过）的打标记录，逐批写出导出内容，
+导出任意数量的音乐时内存占用都保持在一个批次的规模。
+
+支持的格式：
+- json: 以 filepath 为键的嵌套 JSON 数组（与原导出格式一致）
+- jsonl: 每行一条 (音乐, 题目, 打标员) 记录
+- csv: 每行一条 (音乐, 题目, 打标员) 记录，选项列为 JSON 数组
+- columnar: 列式 JSON Lines，首行为题目字典，之后每行为一个批次的列数据，选项编码为题目选项列表中的下标
+"""
+import csv
+import io
+import json
+from datetime import datetime
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+from app.database import SessionLocal
+from app.models import Music, TaggingQuestion, TaggingRecord, TaggingTask, User
+from app.schemas import ExportFilter, ExportFormatEnum
+from app.serialization import SHANGHAI_TZ
+
+# 每批处理的音乐数量
+EXPORT_BATCH_SIZE = 500
+# 逐批读取打标记录时每次从游标获取的行数
+EXPORT_YIELD_PER = 1000
+
+# 各格式的媒体类型与文件扩展名
+EXPORT_MEDIA_TYPES = {
+    ExportFormatEnum.JSON: ("application/json", "json"),
+    ExportFormatEnum.JSONL: ("application/x-ndjson", "jsonl"),
+    ExportFormatEnum.CSV: ("text/csv; charset=utf-8", "csv"),
+    ExportFormatEnum.COLUMNAR: ("application/x-ndjson", "columnar.jsonl"),
+}
+
+CSV_HEADER = ["music_id", "filepath", "question_id", "question", "tagger", "selected_options", "option_indices"]
+
+
+def to_shanghai_naive(dt: datetime | None) -> datetime | None:
+    """将时间转换为不带时区的上海时间（与 SQLite 中任务时间字段的存储方式一致），不带时区的时间视为上海时间"""
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(SHANGHAI_TZ).replace(tzinfo=None)
+
+
+def to_review_time_param(db: Session, dt: datetime | None) -> datetime | None:
+    """审核时间过滤条件的参数值，不带时区的时间视为上海时间
+
+    - SQLite 不保存时区，转换为不带时区的上海时间
+    - 其他数据库（PostgreSQL）使用带时区的时间
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return to_shanghai_naive(dt)
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=SHANGHAI_TZ)
+    return dt
+
+
+def task_conditions(db: Session, export_filter: ExportFilter) -> list:
+    """导出条件中作用于打标任务的过滤条件"""
+    conditions = [TaggingTask.status == export_filter.status]
+    if export_filter.start_time:
+        conditions.append(TaggingTask.review_time >= to_review_time_param(db, export_filter.start_time))
+    if export_filter.end_time:
+        conditions.append(TaggingTask.review_time <= to_review_time_param(db, export_filter.end_time))
+    return conditions
+
+
+def export_music_query(db: Session, export_filter: ExportFilter):
+    """导出范围内音乐的基础查询（未限定 music_ids）
+
+    - 指定了 music_ids 时，导出这些音乐（包括没有符合条件记录的音乐）
+    - 否则导出所有存在符合条件任务的音乐
+    """
+    query = db.query(Music.id, Music.filepath)
+    if export_filter.filepath_prefix:
+        query = query.filter(Music.filepath.startswith(export_filter.filepath_prefix, autoescape=True))
+    if export_filter.music_ids is None:
+        query = query.filter(Music.tagging_tasks.any(and_(*task_conditions(db, export_filter))))
+    return query
+
+
+def count_export_music(db: Session, export_filter: ExportFilter) -> int:
+    """导出范围内的音乐数量（指定 music_ids 时只统计实际存在且符合条件的音乐，与导出的批次一致）"""
+    query = export_music_query(db, export_filter)
+    if export_filter.music_ids is not None:
+        music_ids = sorted(set(export_filter.music_ids))
+        return sum(
+            query.filter(Music.id.in_(music_ids[i:i + EXPORT_BATCH_SIZE])).count()
+            for i in range(0, len(music_ids), EXPORT_BATCH_SIZE)
+        )
+    return query.count()
+
+
+def iter_music_batches(db: Session, export_filter: ExportFilter):
+    """按 id 顺序分批查询音乐，每批返回 [(id, filepath), ...]
+
+    - 指定了 music_ids 时按 id 列表分批
+    - 否则按 id 键集分页遍历
+    """
+    query = export_music_query(db, export_filter)
+
+    if export_filter.music_ids is not None:
+        music_ids = sorted(set(export_filter.music_ids))
+        for i in range(0, len(music_ids), EXPORT_BATCH_SIZE):
+            batch_ids = music_ids[i:i + EXPORT_BATCH_SIZE]
+            batch = query.filter(Music.id.in_(batch_ids)).order_by(Music.id.asc()).all()
+            if batch:
+                yield batch
+        return
+
+    last_id = 0
+    while True:
+        batch = query.filter(Music.id > last_id).order_by(Music.id.asc()).limit(EXPORT_BATCH_SIZE).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1][0]
+
+
+def iter_task_records(db: Session, music_ids: list[int], export_filter: ExportFilter):
+    """查询指定音乐下符合条件任务的打标记录
+
+    返回 (music_id, 题目ID, 题目标题, 打标员用户名, 选中选项) 行，按音乐、任务、记录顺序排列
+    """
+    query = db.query(
+        TaggingTask.music_id,
+        TaggingQuestion.id,
+        TaggingQuestion.title,
+        User.username,
+        TaggingRecord.selected_options
+    ).join(
+        TaggingRecord, TaggingRecord.task_id == TaggingTask.id
+    ).join(
+        TaggingQuestion, TaggingQuestion.id == TaggingRecord.question_id
+    ).join(
+        User, User.id == TaggingTask.tagger_id
+    ).filter(
+        TaggingTask.music_id.in_(music_ids),
+        *task_conditions(db, export_filter)
+    )
+    if export_filter.question_ids:
+        query = query.filter(TaggingRecord.question_id.in_(export_filter.question_ids))
+    return query.order_by(
+        TaggingTask.music_id.asc(), TaggingTask.id.asc(), TaggingRecord.id.asc()
+    ).yield_per(EXPORT_YIELD_PER)
+
+
+def load_option_indexes(db: Session) -> dict[int, dict[str, int]]:
+    """加载所有题目的 {选项: 下标} 映射"""
+    return {
+        question_id: {option: index for index, option in enumerate(options or [])}
+        for question_id, options in db.query(TaggingQuestion.id, TaggingQuestion.options).all()
+    }
+
+
+def to_option_indices(option_indexes: dict[str, int], selected_options: list[str]) -> list[int]:
+    """将选中选项转换为题目选项列表中的下标，已不在选项列表中的选项记为 -1"""
+    return [option_indexes.get(option, -1) for option in selected_options or []]
+
+
+def iter_export_batches(db: Session, export_filter: ExportFilter, progress=None):
+    """逐批生成 (音乐列表 [(id, filepath)], 打标记录行列表)
+
+    - progress: 可选回调，每批处理完成后以该批音乐数量调用
+    """
+    for batch in iter_music_batches(db, export_filter):
+        yield batch, list(iter_task_records(db, [music_id for music_id, _ in batch], export_filter))
+        if progress:
+            progress(len(batch))
+
+
+def iter_json(db: Session, export_filter: ExportFilter, progress=None):
+    """嵌套 JSON 格式，与 json.dumps(export_data, indent=2) 输出一致"""
+    first = True
+    for batch, records in iter_export_batches(db, export_filter, progress):
+        music_data_map = {music_id: {} for music_id, _ in batch}
+        for music_id, _, title, username, selected_options in records:
+            music_data_map[music_id].setdefault(title, {})[username] = selected_options
+        for music_id, filepath in batch:
+            item = json.dumps({filepath: music_data_map[music_id]}, ensure_ascii=False, indent=2)
+            # 数组元素整体缩进 2 个空格
+            item = "\n".join("  " + line for line in item.split("\n"))
+            yield ("[\n" if first else ",\n") + item
+            first = False
+    yield "[]" if first else "\n]"
+
+
+def iter_jsonl(db: Session, export_filter: ExportFilter, progress=None):
+    """JSON Lines 格式，每行一条 (音乐, 题目, 打标员) 记录"""
+    option_indexes = load_option_indexes(db)
+    for batch, records in iter_export_batches(db, export_filter, progress):
+        filepaths = dict(batch)
+        yield "".join(
+            json.dumps({
+                "music_id": music_id,
+                "filepath": filepaths[music_id],
+                "question_id": question_id,
+                "question": title,
+                "tagger": username,
+                "selected_options": selected_options,
+                "option_indices": to_option_indices(option_indexes.get(question_id, {}), selected_options)
+            }, ensure_ascii=False) + "\n"
+            for music_id, question_id, title, username, selected_options in records
+        )
+
+
+def iter_csv(db: Session, export_filter: ExportFilter, progress=None):
+    """CSV 格式，每行一条 (音乐, 题目, 打标员) 记录
+
+    - selected_options 与 option_indices 列为 JSON 数组（选项文本本身可能包含任意分隔符）
+    """
+    option_indexes = load_option_indexes(db)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for batch, records in iter_export_batches(db, export_filter, progress):
+        filepaths = dict(batch)
+        for music_id, question_id, title, username, selected_options in records:
+            writer.writerow([
+                music_id,
+                filepaths[music_id],
+                question_id,
+                title,
+                username,
+                json.dumps(selected_options or [], ensure_ascii=False),
+                json.dumps(to_option_indices(option_indexes.get(question_id, {}), selected_options))
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def iter_columnar(db: Session, export_filter: ExportFilter, progress=None):
+    """列式 JSON Lines 格式
+
+    - 首行：{"questions": {题目ID: {"title": 标题, "options": 选项列表}}}
+    - 之后每行为一个批次（类似 Parquet 的 row group）：
+      {"music": {音乐ID: filepath}, "music_id": [...], "question_id": [...], "tagger": [...], "option_codes": [[...], ...]}
+    """
+    questions = db.query(TaggingQuestion.id, TaggingQuestion.title, TaggingQuestion.options).order_by(TaggingQuestion.id.asc()).all()
+    yield json.dumps({
+        "questions": {str(question_id): {"title": title, "options": options or []} for question_id, title, options in questions}
+    }, ensure_ascii=False) + "\n"
+
+    option_indexes = load_option_indexes(db)
+    for batch, records in iter_export_batches(db, export_filter, progress):
+        if not records:
+            continue
+        yield json.dumps({
+            "music": {str(music_id): filepath for music_id, filepath in batch},
+            "music_id": [record[0] for record in records],
+            "question_id": [record[1] for record in records],
+            "tagger": [record[3] for record in records],
+            "option_codes": [to_option_indices(option_indexes.get(record[1], {}), record[4]) for record in records]
+        }, ensure_ascii=False) + "\n"
+
+
+EXPORT_WRITERS = {
+    ExportFormatEnum.JSON: iter_json,
+    ExportFormatEnum.JSONL: iter_jsonl,
+    ExportFormatEnum.CSV: iter_csv,
+    ExportFormatEnum.COLUMNAR: iter_columnar,
+}
+
+
+def iter_export(export_filter: ExportFilter, export_format: ExportFormatEnum = ExportFormatEnum.JSON, progress=None):
+    """流式生成指定格式的导出内容（UTF-8 字节）
+
+    使用独立的数据库会话，响应流结束时关闭
+    - progress: 可选回调，每批音乐处理完成后以该批音乐数量调用
+    """
+    db = SessionLocal()
+    try:
+        for chunk in EXPORT_WRITERS[export_format](db, export_filter, progress):
+            if chunk:
+                yield chunk.encode("utf-8")
+    finally:
+        db.close()
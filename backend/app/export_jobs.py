@@ -0,0 +1,144 @@
+"""后台导出任务
+
+导出任务在线程池中执行，结果写入导出目录（settings.EXPORT_SPOOL_DIR），
+任务状态与进度保存在 export_jobs 表中，客户端断开后任务继续执行，完成后可随时（分段）下载。
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from app.config import settings
+from app.database import SessionLocal
+from app.export import EXPORT_MEDIA_TYPES, count_export_music, iter_export
+from app.models import ExportJob
+from app.schemas import ExportFilter, ExportJobCreate, ExportJobStatusEnum
+
+_executor = ThreadPoolExecutor(max_workers=settings.EXPORT_WORKERS, thread_name_prefix="export")
+
+
+def export_job_filepath(job: ExportJob) -> str:
+    """导出任务结果文件路径"""
+    _, extension = EXPORT_MEDIA_TYPES[job.format]
+    return os.path.join(settings.EXPORT_SPOOL_DIR, f"tagging_records_{job.id}.{extension}")
+
+
+def update_export_job(db: Session, job_id: int, **values):
+    """更新导出任务状态并立即提交"""
+    db.query(ExportJob).filter(ExportJob.id == job_id).update(values, synchronize_session=False)
+    db.commit()
+
+
+def run_export_job(job_id: int):
+    """执行导出任务：先写入临时文件，完成后重命名为结果文件（失败时删除临时文件）"""
+    db = SessionLocal()
+    temp_filepath = None
+    try:
+        # 以带状态条件的 UPDATE 认领任务：多个进程同时提交同一任务时只有一个能执行
+        claimed = db.query(ExportJob).filter(
+            ExportJob.id == job_id,
+            ExportJob.status == ExportJobStatusEnum.PENDING
+        ).update({ExportJob.status: ExportJobStatusEnum.RUNNING}, synchronize_session=False)
+        db.commit()
+        if claimed != 1:
+            return
+        job = db.query(ExportJob).filter(ExportJob.id == job_id).one()
+        export_filter = ExportFilter.model_validate(job.filters)
+        filepath = export_job_filepath(job)
+        update_export_job(
+            db, job_id,
+            total=count_export_music(db, export_filter),
+            filepath=filepath
+        )
+
+        progress = 0
+
+        def on_progress(count: int):
+            nonlocal progress
+            progress += count
+            update_export_job(db, job_id, progress=progress)
+
+        os.makedirs(settings.EXPORT_SPOOL_DIR, exist_ok=True)
+        temp_filepath = filepath + ".part"
+        with open(temp_filepath, "wb") as f:
+            for chunk in iter_export(export_filter, job.format, on_progress):
+                f.write(chunk)
+        os.replace(temp_filepath, filepath)
+
+        update_export_job(
+            db, job_id,
+            status=ExportJobStatusEnum.SUCCEEDED,
+            file_size=os.path.getsize(filepath),
+            finish_time=func.now()
+        )
+    except Exception as e:
+        db.rollback()
+        if temp_filepath and os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+        update_export_job(
+            db, job_id,
+            status=ExportJobStatusEnum.FAILED,
+            error=str(e),
+            finish_time=func.now()
+        )
+    finally:
+        db.close()
+
+
+def purge_export_jobs(db: Session):
+    """删除超过保留期限的已结束导出任务及其文件"""
+    expire_time = datetime.now(timezone.utc) - timedelta(seconds=settings.EXPORT_JOB_RETENTION_SECONDS)
+    # SQLite 中 func.now() 保存为不带时区的 UTC 时间
+    if db.get_bind().dialect.name == "sqlite":
+        expire_time = expire_time.replace(tzinfo=None)
+    expired_jobs = db.query(ExportJob).filter(
+        ExportJob.status.in_([ExportJobStatusEnum.SUCCEEDED, ExportJobStatusEnum.FAILED]),
+        ExportJob.finish_time < expire_time
+    ).all()
+    for job in expired_jobs:
+        if job.filepath and os.path.exists(job.filepath):
+            os.remove(job.filepath)
+        db.delete(job)
+    db.commit()
+
+
+def create_export_job(db: Session, job_create: ExportJobCreate, creator_id: int) -> ExportJob:
+    """创建导出任务并提交到线程池执行"""
+    purge_export_jobs(db)
+    job = ExportJob(
+        status=ExportJobStatusEnum.PENDING,
+        format=job_create.format,
+        filters=ExportFilter.model_validate(job_create.model_dump()).model_dump(mode="json"),
+        progress=0,
+        creator_id=creator_id
+    )
+    db.add(job)
+    db.commit()
+    _executor.submit(run_export_job, job.id)
+    return job
+
+
+def recover_export_jobs():
+    """服务启动时将等待执行的导出任务重新提交执行
+
+    - 任务执行前会原子地认领，多个服务进程同时恢复时每个任务也只执行一次
+    - 执行中的任务可能正由其他进程执行，不在此处理；服务异常退出后遗留的执行中任务
+      在停止服务后通过 python -m app.commands reset-export-jobs 重置
+    """
+    db = SessionLocal()
+    try:
+        pending_jobs = db.query(ExportJob.id).filter(ExportJob.status == ExportJobStatusEnum.PENDING).all()
+        for job in pending_jobs:
+            _executor.submit(run_export_job, job.id)
+    finally:
+        db.close()
+
+
+def reset_running_export_jobs(db: Session) -> int:
+    """将执行中的导出任务重置为等待执行（仅在所有服务进程停止后执行），返回重置的任务数量"""
+    reset_count = db.query(ExportJob).filter(ExportJob.status == ExportJobStatusEnum.RUNNING).update({
+        ExportJob.status: ExportJobStatusEnum.PENDING,
+        ExportJob.progress: 0
+    }, synchronize_session=False)
+    db.commit()
+    return reset_count
@@ -0,0 +1,360 @@
+"""音乐导入
+
+- 路径清单流式导入：增量解析上传的路径清单（JSON 数组或 JSON Lines），分批去重、
+  在线程池中并发检查文件是否存在、在进程池中解析音频头，并按批次批量插入音乐记录
+- 目录扫描导入：使用 os.scandir 遍历配置的根目录，只列出自上次扫描后修改过的目录中的文件，
+  按批次查询索引，新文件读取元数据后批量插入，已注册但大小或修改时间变化的文件重新读取元数据，
+  已不存在的文件清空元数据
+"""
+import codecs
+import json
+import os
+from collections import defaultdict
+from sqlalchemy import and_, insert, or_, update
+from sqlalchemy.orm import Session
+from app.audio_metadata import read_audio_metadata_batch, stat_files
+from app.config import settings
+from app.models import Music, ScanDirectory
+from app.schemas import BizException
+
+# 支持的音频格式
+SUPPORTED_FORMATS = ['.mp3', '.wav']
+
+# 由音频文件读取的元数据列
+METADATA_COLUMNS = ["file_size", "file_mtime", "duration", "sample_rate", "channels", "bitrate"]
+
+# 每次从上传文件读取的字节数
+READ_CHUNK_SIZE = 64 * 1024
+
+_json_decoder = json.JSONDecoder()
+
+
+def iter_text_chunks(fileobj):
+    """以 UTF-8（兼容 BOM）增量解码读取文件"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    while True:
+        data = fileobj.read(READ_CHUNK_SIZE)
+        if not data:
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(data)
+
+
+def iter_json_array(chunks, buffer: str):
+    """增量解析 JSON 数组，逐个返回元素（buffer 为已读取、以 '[' 开头的内容）"""
+    pos = 1
+    expect_value = True
+    while True:
+        # 跳过空白，必要时继续读取
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                break
+            buffer, pos = next(chunks, None), 0
+            if buffer is None:
+                raise BizException("JSON 文件格式错误")
+
+        char = buffer[pos]
+        if char == "]":
+            return
+        if not expect_value:
+            if char != ",":
+                raise BizException("JSON 文件格式错误")
+            pos += 1
+            expect_value = True
+            continue
+
+        # 解析一个元素，内容不完整时继续读取（只在追加新内容时丢弃已解析的部分，避免每个元素都复制剩余内容）
+        while True:
+            try:
+                value, end = _json_decoder.raw_decode(buffer, pos)
+                break
+            except json.JSONDecodeError:
+                more = next(chunks, None)
+                if more is None:
+                    raise BizException("JSON 文件格式错误")
+                buffer, pos = buffer[pos:] + more, 0
+        yield value
+        pos = end
+        expect_value = False
+
+
+def iter_json_lines(chunks, buffer: str):
+    """逐行解析 JSON Lines，每行为 JSON 字符串或直接为路径"""
+    while True:
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield json.loads(line) if line.startswith('"') else line
+        more = next(chunks, None)
+        if more is None:
+            break
+        buffer += more
+    line = buffer.strip()
+    if line:
+        yield json.loads(line) if line.startswith('"') else line
+
+
+def iter_manifest_paths(fileobj):
+    """增量解析路径清单，根据首个非空白字符判断为 JSON 数组或 JSON Lines"""
+    chunks = iter_text_chunks(fileobj)
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        stripped = buffer.lstrip()
+        if stripped:
+            break
+    else:
+        return
+
+    try:
+        if stripped.startswith("["):
+            yield from iter_json_array(chunks, stripped)
+        else:
+            yield from iter_json_lines(chunks, stripped)
+    except json.JSONDecodeError:
+        raise BizException("JSON 文件格式错误")
+
+
+def iter_batches(iterable, batch_size: int):
+    """将可迭代对象按固定大小分批"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_music(db: Session, rows: list[dict]) -> list[int]:
+    """批量插入音乐记录，返回新记录 id（与 rows 顺序一致）"""
+    if not rows:
+        return []
+    return list(db.scalars(insert(Music).returning(Music.id, sort_by_parameter_order=True), rows).all())
+
+
+def music_row(filepath: str, metadata: dict) -> dict:
+    """音乐记录插入行（包含音频元数据）"""
+    return {
+        "filepath": filepath,
+        "filename": os.path.splitext(os.path.basename(filepath))[0],
+        **metadata
+    }
+
+
+def ingest_batch(db: Session, file_paths: list) -> dict:
+    """导入一批路径：去重、校验格式、读取元数据（文件不存在时为 None），批量插入并提交"""
+    error_paths: list[str] = []
+    candidates: list[str] = []
+    seen: set[str] = set()
+    for filepath in file_paths:
+        if not isinstance(filepath, str):
+            error_paths.append(f"{filepath} (路径格式错误)")
+            continue
+        if filepath in seen:
+            continue
+        seen.add(filepath)
+        candidates.append(filepath)
+
+    # 批量查询已存在的文件路径
+    existing_paths = set()
+    if candidates:
+        existing_paths = {path for path, in db.query(Music.filepath).filter(Music.filepath.in_(candidates)).all()}
+
+    check_paths: list[str] = []
+    for filepath in candidates:
+        if filepath in existing_paths:
+            filename = os.path.splitext(os.path.basename(filepath))[0]
+            error_paths.append(f"{filepath} (文件已存在: {filename})")
+            continue
+        _, ext = os.path.splitext(filepath)
+        if ext.lower() not in SUPPORTED_FORMATS:
+            error_paths.append(f"{filepath} (不支持的格式: {ext})")
+            continue
+        check_paths.append(filepath)
+
+    rows = []
+    for filepath, metadata in zip(check_paths, read_audio_metadata_batch(check_paths)):
+        if metadata is None:
+            error_paths.append(f"{filepath} (文件不存在)")
+            continue
+        rows.append(music_row(filepath, metadata))
+
+    success_ids = insert_music(db, rows)
+    db.commit()
+
+    return {
+        "success_count": len(success_ids),
+        "error_count": len(error_paths),
+        "success_ids": success_ids,
+        "error_paths": error_paths
+    }
+
+
+def iter_ingest(db: Session, fileobj):
+    """流式导入路径清单，逐批返回导入结果"""
+    for file_paths in iter_batches(iter_manifest_paths(fileobj), settings.INGEST_BATCH_SIZE):
+        yield ingest_batch(db, file_paths)
+
+
+def iter_scan_entries(roots: list[str], known_mtimes: dict[str, float], full: bool):
+    """遍历目录树
+
+    - ("file", 路径)：自上次扫描后修改过的目录（或全量扫描时所有目录）中的音频文件
+    - ("dir", 路径, 修改时间, 列出的音频文件路径, 子目录路径)：目录中的文件都已返回后，返回该目录的扫描记录
+
+    目录修改时间在列出内容之前读取，列出期间发生的变化会在下次扫描时重新处理。
+    未修改的目录仍会列出以查找子目录，但跳过其中的文件。
+    """
+    stack = list(reversed(roots))
+    while stack:
+        directory = stack.pop()
+        try:
+            mtime = os.stat(directory).st_mtime
+            changed = full or known_mtimes.get(directory) != mtime
+            subdirectories = []
+            file_paths = set()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+                    elif changed and os.path.splitext(entry.name)[1].lower() in SUPPORTED_FORMATS and entry.is_file():
+                        file_paths.add(entry.path)
+                        yield "file", entry.path
+        except OSError:
+            continue
+        stack.extend(sorted(subdirectories, reverse=True))
+        if changed:
+            yield "dir", directory, mtime, file_paths, set(subdirectories)
+
+
+def music_in_directory(db: Session, directory: str, recursive: bool = False):
+    """目录中音乐的过滤条件（recursive 为 False 时只包含直接位于该目录中的文件）
+
+    SQLite 使用 filepath 索引上的范围查询；PostgreSQL 中字符串范围比较受排序规则影响，使用前缀 LIKE（可使用三元组索引）
+    """
+    prefix = os.path.join(directory, "")
+    escaped_prefix = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    if db.get_bind().dialect.name == "sqlite":
+        # 以 prefix 开头的字符串都在 [prefix, prefix 最后一个字符加一) 区间内
+        condition = and_(Music.filepath > prefix, Music.filepath < prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    else:
+        condition = Music.filepath.like(f"{escaped_prefix}%", escape="\\")
+    if not recursive:
+        condition = and_(condition, ~Music.filepath.like(f"{escaped_prefix}%{os.sep}%", escape="\\"))
+    return condition
+
+
+def mark_music_missing(db: Session, condition, listed_paths: set[str] = frozenset()) -> list[str]:
+    """清空满足 condition 但不在 listed_paths 中的音乐的元数据，返回路径
+
+    播放时会检查文件并提示不存在，文件恢复后重新扫描时会重新读取元数据
+    """
+    missing = [
+        (music_id, filepath)
+        for music_id, filepath in db.query(Music.id, Music.filepath).filter(condition, Music.file_size.isnot(None)).all()
+        if filepath not in listed_paths
+    ]
+    if missing:
+        db.execute(update(Music), [{"id": music_id, **dict.fromkeys(METADATA_COLUMNS)} for music_id, _ in missing])
+    return [filepath for _, filepath in missing]
+
+
+def save_scan_batch(
+    db: Session,
+    file_paths: list[str],
+    directories: list[tuple[str, float, set[str], set[str]]],
+    known_mtimes: dict[str, float],
+    known_subdirectories: dict[str, set[str]]
+) -> dict:
+    """保存一批扫描结果，在同一事务中提交
+
+    - 新文件：读取元数据后插入
+    - 已注册的文件：大小或修改时间与记录不一致时重新读取元数据
+    - 已完成的目录：记录中位于该目录（或已删除的子目录）但文件已不存在的音乐清空元数据，保存目录的修改时间
+    """
+    registered = {}
+    if file_paths:
+        registered = {
+            music.filepath: music
+            for music in db.query(Music.id, Music.filepath, Music.file_size, Music.file_mtime).filter(Music.filepath.in_(file_paths)).all()
+        }
+    new_paths = [filepath for filepath in file_paths if filepath not in registered]
+    success_ids = insert_music(db, [
+        music_row(filepath, metadata)
+        for filepath, metadata in zip(new_paths, read_audio_metadata_batch(new_paths))
+        if metadata is not None
+    ])
+
+    registered_paths = list(registered)
+    changed_paths = [
+        filepath
+        for filepath, stat_result in zip(registered_paths, stat_files(registered_paths))
+        if stat_result is not None
+        and (registered[filepath].file_size, registered[filepath].file_mtime) != (stat_result.st_size, stat_result.st_mtime)
+    ]
+    updated_rows = [
+        {"id": registered[filepath].id, **metadata}
+        for filepath, metadata in zip(changed_paths, read_audio_metadata_batch(changed_paths))
+        if metadata is not None
+    ]
+    if updated_rows:
+        db.execute(update(Music), updated_rows)
+
+    missing_paths = []
+    for directory, _, listed_paths, subdirectories in directories:
+        missing_paths.extend(mark_music_missing(db, music_in_directory(db, directory), listed_paths))
+        for removed_directory in known_subdirectories.get(directory, set()) - subdirectories:
+            missing_paths.extend(mark_music_missing(db, music_in_directory(db, removed_directory, recursive=True)))
+            db.query(ScanDirectory).filter(
+                or_(ScanDirectory.path == removed_directory, ScanDirectory.path.startswith(os.path.join(removed_directory, ""), autoescape=True))
+            ).delete(synchronize_session=False)
+
+    directory_mtimes = {directory: mtime for directory, mtime, _, _ in directories}
+    new_directories = [{"path": path, "mtime": mtime} for path, mtime in directory_mtimes.items() if path not in known_mtimes]
+    changed_directories = [{"path": path, "mtime": mtime} for path, mtime in directory_mtimes.items() if path in known_mtimes]
+    if new_directories:
+        db.execute(insert(ScanDirectory), new_directories)
+    if changed_directories:
+        db.execute(update(ScanDirectory), changed_directories)
+    db.commit()
+    known_mtimes.update(directory_mtimes)
+    return {
+        "scanned_directories": len(directories),
+        "success_count": len(success_ids),
+        "updated_count": len(updated_rows),
+        "missing_count": len(missing_paths),
+        "missing_paths": missing_paths
+    }
+
+
+def iter_scan(db: Session, roots: list[str], full: bool = False):
+    """扫描目录导入音乐，逐批返回导入结果
+
+    - 只处理自上次扫描后修改过的目录（新增、删除、重命名文件会修改目录的修改时间）；
+      原地修改文件内容不会改变目录的修改时间，需要 full 为 True 全量扫描才能发现
+    - full 为 True 时忽略上次扫描记录，列出所有目录中的文件
+    """
+    roots = list(dict.fromkeys(os.path.abspath(root) for root in roots))
+    known_mtimes = dict(db.query(ScanDirectory.path, ScanDirectory.mtime).all())
+    known_subdirectories = defaultdict(set)
+    for path in known_mtimes:
+        known_subdirectories[os.path.dirname(path)].add(path)
+    file_paths: list[str] = []
+    directories: list[tuple[str, float, set[str], set[str]]] = []
+    for entry in iter_scan_entries(roots, known_mtimes, full):
+        if entry[0] == "file":
+            file_paths.append(entry[1])
+        else:
+            directories.append(entry[1:])
+        if len(file_paths) >= settings.INGEST_BATCH_SIZE or len(directories) >= settings.INGEST_BATCH_SIZE:
+            yield save_scan_batch(db, file_paths, directories, known_mtimes, known_subdirectories)
+            file_paths, directories = [], []
+    if file_paths or directories:
+        yield save_scan_batch(db, file_paths, directories, known_mtimes, known_subdirectories)
@@ -1,12 +1,29 @@
 import uvicorn
+from contextlib import asynccontextmanager
+from anyio import to_thread
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
+from app.config import settings
 from app.schemas import ApiResponse, BizException
 from app.database import engine, Base
 from app.routers import api_router
+from app.migrations import run_migrations
+from app.export_jobs import recover_export_jobs
+from app.audio_metadata import shutdown_metadata_executor
 
-app = FastAPI(title="音乐打标平台")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 所有路由均为同步函数：路由、依赖以及流式响应的同步迭代器都在线程池中执行，不阻塞事件循环
+    # 线程池大小决定了可同时执行的阻塞操作数量（导入、导出、转码等长时间操作也占用其中的线程）
+    to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
+    # 重新提交上次未执行的后台导出任务
+    recover_export_jobs()
+    yield
+    shutdown_metadata_executor()
+
+# 默认使用 orjson 渲染响应，列表等大响应由路由直接返回 app.serialization.api_response()
+app = FastAPI(title="音乐打标平台", lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # 配置 CORS（跨域资源共享）
 app.add_middleware(
@@ -23,6 +40,8 @@ app.include_router(api_router)
 
 # 创建数据库表
 Base.metadata.create_all(bind=engine)
+# 执行数据库版本迁移（已有数据库的结构变更）
+run_migrations(engine)
 
 # 注册异常处理器
 # 业务异常
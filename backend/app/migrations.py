@@ -0,0 +1,187 @@
+"""数据库版本迁移
+
+create_all 只会创建缺失的表，不会修改已有表。
+已有数据库的结构变更以版本号顺序登记在 MIGRATIONS 中，启动时执行尚未执行过的迁移，
+已执行的版本记录在 schema_version 表中。
+每个迁移都需要可重复执行（新建数据库时 create_all 已经创建了最新结构）。
+"""
+from sqlalchemy import Column, DateTime, Index, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from sqlalchemy.dialects.postgresql import JSONB
+from app.analytics import rebuild_analytics
+from app.database import create_pg_extensions, pg_trgm_installed
+from app.search import create_search_index
+
+schema_version_table = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_time", DateTime(timezone = True), server_default = func.now()),
+)
+
+# 迁移中创建索引使用的表结构快照（只声明索引用到的列），与模型之后的变更无关
+snapshot_metadata = MetaData()
+users_snapshot = Table(
+    "users", snapshot_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String),
+)
+music_snapshot = Table(
+    "music", snapshot_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("filepath", String),
+    Column("filename", String),
+    Column("valid_tagging_count", Integer),
+    Column("create_time", DateTime(timezone = True)),
+)
+tagging_records_snapshot = Table(
+    "tagging_records", snapshot_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("task_id", Integer),
+    Column("question_id", Integer),
+    Column("selected_options", JSONB),
+)
+tagging_tasks_snapshot = Table(
+    "tagging_tasks", snapshot_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("music_id", Integer),
+    Column("status", String),
+    Column("tagger_id", Integer),
+    Column("reviewer_id", Integer),
+    Column("creator_id", Integer),
+    Column("create_time", DateTime(timezone = True)),
+)
+
+# 版本 2：常用过滤 / 排序列的索引
+FILTER_INDEXES = [
+    Index("ix_music_filename_id", music_snapshot.c.filename, music_snapshot.c.id),
+    Index("ix_music_valid_tagging_count_id", music_snapshot.c.valid_tagging_count, music_snapshot.c.id),
+    Index("ix_music_create_time_id", music_snapshot.c.create_time, music_snapshot.c.id),
+    Index("ix_tagging_records_task_id", tagging_records_snapshot.c.task_id),
+    Index("ix_tagging_records_question_id", tagging_records_snapshot.c.question_id),
+    Index("ix_tagging_tasks_create_time_id", tagging_tasks_snapshot.c.create_time, tagging_tasks_snapshot.c.id),
+    Index("ix_tagging_tasks_status_create_time", tagging_tasks_snapshot.c.status, tagging_tasks_snapshot.c.create_time),
+    Index("ix_tagging_tasks_tagger_id_status", tagging_tasks_snapshot.c.tagger_id, tagging_tasks_snapshot.c.status),
+    Index("ix_tagging_tasks_reviewer_id_status", tagging_tasks_snapshot.c.reviewer_id, tagging_tasks_snapshot.c.status),
+    Index("ix_tagging_tasks_music_id_status", tagging_tasks_snapshot.c.music_id, tagging_tasks_snapshot.c.status),
+]
+
+# 版本 4：PostgreSQL 三元组 / GIN 索引
+POSTGRESQL_INDEXES = [
+    Index(
+        "ix_users_username_trgm", users_snapshot.c.username,
+        postgresql_using="gin", postgresql_ops={"username": "gin_trgm_ops"}
+    ).ddl_if(callable_=pg_trgm_installed),
+    Index(
+        "ix_music_filepath_trgm", music_snapshot.c.filepath,
+        postgresql_using="gin", postgresql_ops={"filepath": "gin_trgm_ops"}
+    ).ddl_if(callable_=pg_trgm_installed),
+    Index(
+        "ix_music_filename_trgm", music_snapshot.c.filename,
+        postgresql_using="gin", postgresql_ops={"filename": "gin_trgm_ops"}
+    ).ddl_if(callable_=pg_trgm_installed),
+    Index(
+        "ix_tagging_records_selected_options", tagging_records_snapshot.c.selected_options,
+        postgresql_using="gin"
+    ).ddl_if(dialect="postgresql"),
+]
+
+# 版本 5：关键字搜索创建人
+SEARCH_INDEXES = [
+    Index("ix_tagging_tasks_creator_id", tagging_tasks_snapshot.c.creator_id),
+]
+
+
+def add_music_valid_tagging_count(conn: Connection):
+    """music 表增加 valid_tagging_count 列，并根据已审核通过的任务回填"""
+    columns = {column["name"] for column in inspect(conn).get_columns("music")}
+    if "valid_tagging_count" not in columns:
+        conn.execute(text("ALTER TABLE music ADD COLUMN valid_tagging_count INTEGER DEFAULT 0"))
+    conn.execute(text(
+        "UPDATE music SET valid_tagging_count = ("
+        "SELECT COUNT(tagging_tasks.id) FROM tagging_tasks "
+        "WHERE tagging_tasks.music_id = music.id AND tagging_tasks.status = 'REVIEWED')"
+    ))
+
+
+def add_music_metadata_columns(conn: Connection):
+    """music 表增加音频元数据列（已有音乐可通过 refresh-music-metadata 命令回填）"""
+    columns = {column["name"] for column in inspect(conn).get_columns("music")}
+    for name, column_type in [
+        ("file_size", "INTEGER"),
+        ("file_mtime", "FLOAT"),
+        ("duration", "FLOAT"),
+        ("sample_rate", "INTEGER"),
+        ("channels", "INTEGER"),
+        ("bitrate", "INTEGER"),
+    ]:
+        if name not in columns:
+            conn.execute(text(f"ALTER TABLE music ADD COLUMN {name} {column_type}"))
+
+
+def create_indexes(conn: Connection, indexes: list[Index]):
+    """创建索引（已存在的跳过）"""
+    for index in indexes:
+        index.create(conn, checkfirst=True)
+
+
+def add_filter_indexes(conn: Connection):
+    """创建常用过滤 / 排序列的索引"""
+    create_indexes(conn, FILTER_INDEXES)
+
+
+def upgrade_postgresql_schema(conn: Connection):
+    """PostgreSQL：JSON 列改为 JSONB，创建 pg_trgm 扩展及三元组 / GIN 索引（其他数据库无操作）"""
+    if conn.dialect.name != "postgresql":
+        return
+    inspector = inspect(conn)
+    for table_name, column_name in [("tagging_questions", "options"), ("tagging_records", "selected_options")]:
+        column = next(column for column in inspector.get_columns(table_name) if column["name"] == column_name)
+        if not isinstance(column["type"], JSONB):
+            conn.execute(text(
+                f"ALTER TABLE {table_name} ALTER COLUMN {column_name} TYPE JSONB USING {column_name}::jsonb"
+            ))
+    create_pg_extensions(conn)
+    create_indexes(conn, POSTGRESQL_INDEXES)
+
+
+def add_search_indexes(conn: Connection):
+    """创建关键字搜索所需的索引：任务创建人索引，SQLite 音乐路径 / 用户名全文索引"""
+    create_indexes(conn, SEARCH_INDEXES)
+    create_search_index(conn)
+
+
+def backfill_analytics(conn: Connection):
+    """根据已审核通过的任务回填标注统计汇总表（表已由 create_all 创建）"""
+    with Session(bind=conn) as db:
+        rebuild_analytics(db)
+        db.flush()
+
+
+# 迁移列表：(版本号, 描述, 迁移函数)，版本号只增不改
+MIGRATIONS = [
+    (1, "music 增加 valid_tagging_count 列", add_music_valid_tagging_count),
+    (2, "创建常用过滤/排序列的索引", add_filter_indexes),
+    (3, "music 增加音频元数据列", add_music_metadata_columns),
+    (4, "PostgreSQL 使用 JSONB 及三元组 / GIN 索引", upgrade_postgresql_schema),
+    (5, "创建关键字搜索索引（SQLite 全文索引）", add_search_indexes),
+    (6, "回填标注统计汇总表", backfill_analytics),
+]
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    """执行尚未执行的迁移，返回本次执行的版本号"""
+    applied_versions = []
+    with engine.begin() as conn:
+        schema_version_table.create(conn, checkfirst=True)
+        current_version = conn.execute(select(func.max(schema_version_table.c.version))).scalar() or 0
+        for version, description, migrate in MIGRATIONS:
+            if version <= current_version:
+                continue
+            migrate(conn)
+            conn.execute(schema_version_table.insert().values(version=version, description=description))
+            applied_versions.append(version)
+    return applied_versions
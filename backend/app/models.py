@@ -1,8 +1,21 @@
-from sqlalchemy import JSON, Boolean, Column, Integer, String, DateTime, ForeignKey, Enum
+from sqlalchemy import JSON, Boolean, Column, Integer, String, DateTime, Float, ForeignKey, Enum, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from app.schemas import TaggingStatusEnum, UserRoleEnum
-from app.database import Base
+from app.schemas import ExportFormatEnum, ExportJobStatusEnum, TaggingStatusEnum, UserRoleEnum
+from app.database import Base, pg_trgm_installed
+
+# JSON 列，PostgreSQL 中使用 JSONB（支持 GIN 索引与包含查询）
+JSONVariant = JSON().with_variant(JSONB(), "postgresql")
+
+
+def trigram_index(name: str, column: str) -> Index:
+    """PostgreSQL 三元组 GIN 索引，用于 LIKE '%关键字%' 搜索（其他数据库或未安装 pg_trgm 时不创建）"""
+    return Index(
+        name, column,
+        postgresql_using="gin",
+        postgresql_ops={column: "gin_trgm_ops"}
+    ).ddl_if(callable_=pg_trgm_installed)
 
 
 class User(Base):
@@ -19,6 +32,11 @@ class User(Base):
     review_tasks = relationship("TaggingTask", foreign_keys="TaggingTask.reviewer_id", back_populates="reviewer")
     created_tasks = relationship("TaggingTask", foreign_keys="TaggingTask.creator_id", back_populates="creator")
 
+    __table_args__ = (
+        # 任务列表关键字搜索
+        trigram_index("ix_users_username_trgm", "username"),
+    )
+
 
 class Music(Base):
     """音乐表"""
@@ -27,10 +45,27 @@ class Music(Base):
     id = Column(Integer, primary_key=True)
     filepath = Column(String, unique=True)
     filename = Column(String)
+    valid_tagging_count = Column(Integer, default = 0, server_default = "0")  # 已审核通过的任务数，随审核/删除任务增量维护
+    file_size = Column(Integer)  # 文件大小（字节），以下元数据在导入时读取，文件不存在时为空
+    file_mtime = Column(Float)  # 文件修改时间（时间戳）
+    duration = Column(Float)  # 时长（秒）
+    sample_rate = Column(Integer)  # 采样率（Hz）
+    channels = Column(Integer)  # 声道数
+    bitrate = Column(Integer)  # 码率（bit/s），VBR 为平均码率
     create_time = Column(DateTime(timezone = True), server_default = func.now())
 
     tagging_tasks = relationship("TaggingTask", foreign_keys="TaggingTask.music_id", back_populates="music")
 
+    __table_args__ = (
+        # 音乐列表排序 / 游标分页
+        Index("ix_music_filename_id", "filename", "id"),
+        Index("ix_music_valid_tagging_count_id", "valid_tagging_count", "id"),
+        Index("ix_music_create_time_id", "create_time", "id"),
+        # 音乐列表路径搜索 / 任务列表关键字搜索
+        trigram_index("ix_music_filepath_trgm", "filepath"),
+        trigram_index("ix_music_filename_trgm", "filename"),
+    )
+
 
 class TaggingQuestion(Base):
     """打标题目表"""
@@ -40,7 +75,7 @@ class TaggingQuestion(Base):
     title = Column(String, unique=True)
     description = Column(String)
     is_multiple_choice = Column(Boolean)
-    options = Column(JSON)
+    options = Column(JSONVariant)
     create_time = Column(DateTime(timezone = True), server_default = func.now())
 
 
@@ -51,11 +86,19 @@ class TaggingRecord(Base):
     id = Column(Integer, primary_key=True)
     task_id = Column(Integer, ForeignKey("tagging_tasks.id"))
     question_id = Column(Integer, ForeignKey("tagging_questions.id"))
-    selected_options = Column(JSON)
+    selected_options = Column(JSONVariant)
 
     task = relationship("TaggingTask", foreign_keys=[task_id], back_populates="records")
     question = relationship("TaggingQuestion", foreign_keys=[question_id])
 
+    __table_args__ = (
+        # 按任务加载/删除记录、按题目删除记录
+        Index("ix_tagging_records_task_id", "task_id"),
+        Index("ix_tagging_records_question_id", "question_id"),
+        # 按选中选项查询（PostgreSQL JSONB 包含查询）
+        Index("ix_tagging_records_selected_options", "selected_options", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+
 
 class TaggingTask(Base):
     """打标任务表"""
@@ -77,3 +120,87 @@ class TaggingTask(Base):
     reviewer = relationship("User", foreign_keys=[reviewer_id], back_populates="review_tasks")
     creator = relationship("User", foreign_keys=[creator_id], back_populates="created_tasks")
     records = relationship("TaggingRecord", foreign_keys="TaggingRecord.task_id", back_populates="task")
+
+    __table_args__ = (
+        # 任务列表：按创建时间倒序 / 游标分页，可叠加状态、打标员、审核员过滤
+        Index("ix_tagging_tasks_create_time_id", "create_time", "id"),
+        Index("ix_tagging_tasks_status_create_time", "status", "create_time"),
+        Index("ix_tagging_tasks_tagger_id_status", "tagger_id", "status"),
+        Index("ix_tagging_tasks_reviewer_id_status", "reviewer_id", "status"),
+        # 按音乐删除任务、导出及统计有效打标数
+        Index("ix_tagging_tasks_music_id_status", "music_id", "status"),
+        # 按关键字搜索创建人
+        Index("ix_tagging_tasks_creator_id", "creator_id"),
+    )
+
+
+class ExportJob(Base):
+    """后台导出任务表"""
+    __tablename__ = "export_jobs"
+
+    id = Column(Integer, primary_key=True)
+    status = Column(Enum(ExportJobStatusEnum))
+    format = Column(Enum(ExportFormatEnum))
+    filters = Column(JSON)  # ExportFilter 的 JSON 表示
+    progress = Column(Integer, default = 0)  # 已处理的音乐数量
+    total = Column(Integer)  # 待处理的音乐数量
+    filepath = Column(String)  # 导出文件路径
+    file_size = Column(Integer)
+    error = Column(String)
+    creator_id = Column(Integer, ForeignKey("users.id"))
+    create_time = Column(DateTime(timezone = True), server_default = func.now())
+    finish_time = Column(DateTime(timezone = True))
+
+
+class ScanDirectory(Base):
+    """音乐目录扫描记录表（用于增量扫描）"""
+    __tablename__ = "scan_directories"
+
+    path = Column(String, primary_key=True)
+    mtime = Column(Float)  # 上次扫描时目录的修改时间
+
+
+class OptionStat(Base):
+    """标注统计汇总表：已审核通过任务中各题目选项被选择的次数（审核通过 / 删除时增量更新）"""
+    __tablename__ = "analytics_option_stats"
+
+    question_id = Column(Integer, primary_key=True)
+    option = Column(String, primary_key=True)
+    selected_count = Column(Integer, nullable=False, default=0)
+
+
+class TaggerStat(Base):
+    """标注统计汇总表：各打标员已审核通过的任务数"""
+    __tablename__ = "analytics_tagger_stats"
+
+    tagger_id = Column(Integer, primary_key=True)
+    reviewed_count = Column(Integer, nullable=False, default=0)
+
+
+class MusicAnswerStat(Base):
+    """标注统计汇总表：每首音乐每道题各答案（排序后的选项列表 JSON）的已审核通过任务数"""
+    __tablename__ = "analytics_music_answers"
+
+    music_id = Column(Integer, primary_key=True)
+    question_id = Column(Integer, primary_key=True)
+    answer = Column(String, primary_key=True)
+    task_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # 删除题目时清理
+        Index("ix_analytics_music_answers_question_id", "question_id"),
+    )
+
+
+class MusicAgreementStat(Base):
+    """标注统计汇总表：每首音乐的打标一致率（各题多数答案占比的平均值），随 analytics_music_answers 重新计算"""
+    __tablename__ = "analytics_music_agreement"
+
+    music_id = Column(Integer, primary_key=True)
+    tagger_count = Column(Integer, nullable=False)  # 已审核通过的任务数
+    agreement = Column(Float, nullable=False)
+
+    __table_args__ = (
+        # 按一致率从低到高列出有分歧的音乐
+        Index("ix_analytics_music_agreement_agreement_music_id", "agreement", "music_id"),
+    )
@@ -0,0 +1,103 @@
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import DateTime, String, literal, tuple_, type_coerce
+from sqlalchemy.orm import Query
+from app.schemas import BizException
+
+# 缓存总数的有效期（秒）与最大条目数
+COUNT_CACHE_TTL = 30
+COUNT_CACHE_MAX_SIZE = 1024
+
+_count_cache: dict[tuple, tuple[float, int]] = {}
+_count_cache_lock = threading.Lock()
+
+
+def encode_cursor(sort_key: str, values: list) -> str:
+    """将排序键和最后一行的排序值编码为不透明游标"""
+    values = [value.isoformat(sep=" ") if isinstance(value, datetime) else value for value in values]
+    payload = json.dumps({"k": sort_key, "v": values}, ensure_ascii=False, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_key: str, size: int) -> list:
+    """解析游标，校验其与当前排序方式一致"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        values = payload["v"]
+    except (ValueError, KeyError, TypeError):
+        raise BizException("无效的游标")
+    if payload.get("k") != sort_key or not isinstance(values, list) or len(values) != size:
+        raise BizException("游标与当前排序方式不匹配")
+    return values
+
+
+def cursor_column(column, dialect_name: str):
+    """游标比较使用的列表达式
+    - SQLite 中日期时间列按数据库中的原始值（字符串）比较，避免存储格式与绑定参数格式不一致
+    """
+    if dialect_name == "sqlite" and isinstance(column.type, DateTime):
+        return type_coerce(column, String)
+    return column
+
+
+def cursor_value(key, value):
+    """游标中的值转换为比较参数（日期时间列在游标中保存为 ISO 格式字符串）"""
+    if isinstance(key.type, DateTime) and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def paginate_by_cursor(
+    query: Query,
+    sort_key: str,
+    columns: list,
+    descending: bool,
+    cursor: str | None,
+    page_size: int
+) -> tuple[list, str | None]:
+    """键集（游标）分页
+    - columns 为排序列，最后一列须唯一（通常为 id）
+    - cursor 为空时返回第一页
+    - 返回 (当前页数据, 下一页游标)，没有下一页时游标为 None
+    """
+    dialect_name = query.session.get_bind().dialect.name
+    keys = [cursor_column(column, dialect_name) for column in columns]
+    if cursor:
+        values = [
+            literal(cursor_value(key, value), key.type)
+            for key, value in zip(keys, decode_cursor(cursor, sort_key, len(keys)))
+        ]
+        if descending:
+            query = query.filter(tuple_(*keys) < tuple_(*values))
+        else:
+            query = query.filter(tuple_(*keys) > tuple_(*values))
+
+    order_by = [key.desc() if descending else key.asc() for key in keys]
+    rows = query.add_columns(*keys).order_by(*order_by).limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(sort_key, list(rows[-1][1:]))
+    return [row[0] for row in rows], next_cursor
+
+
+def cached_count(query: Query, cache_key: tuple) -> int:
+    """带短期缓存的总数查询，用于游标分页中的近似总数"""
+    now = time.monotonic()
+    with _count_cache_lock:
+        cached = _count_cache.get(cache_key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    total = query.count()
+
+    with _count_cache_lock:
+        if len(_count_cache) >= COUNT_CACHE_MAX_SIZE:
+            _count_cache.clear()
+        _count_cache[cache_key] = (now + COUNT_CACHE_TTL, total)
+    return total
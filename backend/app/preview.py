@@ -0,0 +1,178 @@
+"""试听版本转码缓存
+
+WAV 原始文件体积大，试听时可请求低码率的预览版本（quality=preview）：
+- 首次请求时使用 pydub 转换为单声道、低采样率的压缩格式（默认 MP3，需要 ffmpeg；WAV 格式不需要）
+- 转码结果按 (路径, 修改时间) 缓存在 settings.PREVIEW_CACHE_DIR 中，源文件修改后自动生成新版本
+- 缓存总大小超过 settings.PREVIEW_CACHE_MAX_BYTES 时按最近使用时间（文件 mtime，命中时更新）淘汰
+- 可在后台预热即将播放的文件（生成预览版本，或提示操作系统预读原文件）
+"""
+import hashlib
+import os
+import threading
+from typing import BinaryIO
+from concurrent.futures import ThreadPoolExecutor
+from pydub import AudioSegment
+from app.config import settings
+
+# 支持生成预览版本的源文件格式（MP3 本身已是压缩格式，直接返回原文件）
+PREVIEW_SOURCE_FORMATS = ['.wav']
+
+# 预览格式的媒体类型
+PREVIEW_MEDIA_TYPES = {
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav",
+    "ogg": "audio/ogg",
+}
+
+_lock = threading.Lock()
+# 正在生成的预览文件锁，避免同一文件被并发转码
+_key_locks: dict[str, threading.Lock] = {}
+# 缓存目录当前总大小，首次使用时扫描目录得到
+_cache_size: int | None = None
+
+# 后台预热线程池
+_executor = ThreadPoolExecutor(max_workers=settings.PREVIEW_WARM_WORKERS, thread_name_prefix="preview")
+
+
+def supports_preview(path: str) -> bool:
+    """是否为可生成预览版本的源文件格式"""
+    return os.path.splitext(path)[1].lower() in PREVIEW_SOURCE_FORMATS
+
+
+def preview_media_type() -> str:
+    """预览格式的媒体类型"""
+    return PREVIEW_MEDIA_TYPES.get(settings.PREVIEW_FORMAT, "application/octet-stream")
+
+
+def preview_filepath(path: str, mtime: float) -> str:
+    """预览缓存文件路径，由源文件路径、修改时间与预览参数决定"""
+    key = f"{path}\0{mtime}\0{settings.PREVIEW_SAMPLE_RATE}\0{settings.PREVIEW_CHANNELS}\0{settings.PREVIEW_BITRATE}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(settings.PREVIEW_CACHE_DIR, f"{digest}.{settings.PREVIEW_FORMAT}")
+
+
+def transcode_preview(path: str, output_path: str):
+    """将源文件转码为预览版本（先写入临时文件，完成后重命名）"""
+    segment = AudioSegment.from_file(path)
+    segment = segment.set_channels(settings.PREVIEW_CHANNELS).set_frame_rate(settings.PREVIEW_SAMPLE_RATE)
+    temp_path = f"{output_path}.{threading.get_ident()}.part"
+    try:
+        with open(temp_path, "wb") as f:
+            if settings.PREVIEW_FORMAT == "wav":
+                segment.export(f, format="wav")
+            else:
+                segment.export(f, format=settings.PREVIEW_FORMAT, bitrate=settings.PREVIEW_BITRATE)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def scan_cache_size() -> int:
+    """统计缓存目录中预览文件的总大小"""
+    total = 0
+    with os.scandir(settings.PREVIEW_CACHE_DIR) as entries:
+        for entry in entries:
+            if entry.is_file() and not entry.name.endswith(".part"):
+                total += entry.stat().st_size
+    return total
+
+
+def evict_previews(keep_path: str):
+    """缓存超出上限时，按 mtime 从旧到新删除预览文件（保留刚生成的文件）"""
+    global _cache_size
+    entries = []
+    with os.scandir(settings.PREVIEW_CACHE_DIR) as it:
+        for entry in it:
+            if entry.is_file() and not entry.name.endswith(".part") and entry.path != keep_path:
+                stat_result = entry.stat()
+                entries.append((stat_result.st_mtime, stat_result.st_size, entry.path))
+    entries.sort()
+    for _, size, path in entries:
+        if _cache_size <= settings.PREVIEW_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        _cache_size -= size
+
+
+def open_cached_preview(output_path: str) -> BinaryIO | None:
+    """打开已缓存的预览文件并更新 mtime 作为最近使用时间，不存在时返回 None
+
+    在 _lock 中打开，不会与淘汰同时进行；打开后文件即使被淘汰删除，已打开的文件仍可完整读取
+    """
+    with _lock:
+        try:
+            f = open(output_path, "rb")
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(output_path)
+        except FileNotFoundError:
+            # 已被其他进程淘汰，已打开的文件仍可读取
+            pass
+        return f
+
+
+def get_preview(path: str, mtime: float) -> BinaryIO:
+    """打开源文件的预览缓存文件，不存在时同步生成，由调用方负责关闭
+
+    返回已打开的文件而不是路径：返回后缓存文件可能随时被其他请求淘汰删除
+    """
+    global _cache_size
+    output_path = preview_filepath(path, mtime)
+    f = open_cached_preview(output_path)
+    if f is not None:
+        return f
+
+    with _lock:
+        key_lock = _key_locks.setdefault(output_path, threading.Lock())
+    try:
+        with key_lock:
+            # 等待期间可能已由其他请求生成
+            f = open_cached_preview(output_path)
+            if f is not None:
+                return f
+            os.makedirs(settings.PREVIEW_CACHE_DIR, exist_ok=True)
+            transcode_preview(path, output_path)
+            with _lock:
+                if _cache_size is None:
+                    _cache_size = scan_cache_size()
+                else:
+                    _cache_size += os.path.getsize(output_path)
+                if _cache_size > settings.PREVIEW_CACHE_MAX_BYTES:
+                    evict_previews(output_path)
+                return open(output_path, "rb")
+    finally:
+        with _lock:
+            _key_locks.pop(output_path, None)
+
+
+def warm_file(path: str):
+    """提示操作系统预读原文件到页缓存（不支持 posix_fadvise 的平台忽略）"""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def warm_music_file(path: str):
+    """预热音乐文件：可生成预览版本的文件按实际修改时间生成预览，其他文件预读原文件，失败时忽略（播放时会重新处理）"""
+    try:
+        if supports_preview(path):
+            get_preview(path, os.path.getmtime(path)).close()
+        else:
+            warm_file(path)
+    except Exception:
+        pass
+
+
+def warm_music_files(paths: list[str]):
+    """提交后台预热任务，立即返回"""
+    for path in paths:
+        _executor.submit(warm_music_file, path)
@@ -0,0 +1,51 @@
+"""打标题目目录缓存
+
+题目列表很少变化但被频繁请求：在进程内缓存序列化后的响应体及其 ETag，
+题目创建/更新/删除后失效。多进程部署时其他进程的缓存最多在 QUESTION_CATALOG_TTL_SECONDS 后刷新。
+"""
+import hashlib
+import threading
+import time
+from sqlalchemy.orm import Session
+from app.config import settings
+from app.models import TaggingQuestion
+from app.schemas import ApiResponse, TaggingQuestionResponse
+from app.serialization import dump_json
+
+_lock = threading.Lock()
+# 缓存版本号，每次失效时递增，避免失效前开始的查询写入过期结果
+_version = 0
+# (版本号, 过期时间, ETag, 响应体)
+_catalog: tuple[int, float, str, bytes] | None = None
+
+
+def invalidate_question_catalog():
+    """题目变更后使缓存失效"""
+    global _version, _catalog
+    with _lock:
+        _version += 1
+        _catalog = None
+
+
+def get_question_catalog(db: Session, to_response) -> tuple[str, bytes]:
+    """返回 (ETag, 响应体)，缓存未命中时查询所有题目（按标题排序）并序列化
+
+    - to_response: 题目模型转换为 TaggingQuestionResponse 的函数
+    """
+    global _catalog
+    now = time.monotonic()
+    with _lock:
+        if _catalog and _catalog[1] > now:
+            return _catalog[2], _catalog[3]
+        version = _version
+
+    questions: list[TaggingQuestionResponse] = [
+        to_response(question) for question in db.query(TaggingQuestion).order_by(TaggingQuestion.title.asc()).all()
+    ]
+    body = dump_json(ApiResponse.success_response(questions))
+    etag = f'"{hashlib.sha1(body).hexdigest()}"'
+
+    with _lock:
+        if version == _version:
+            _catalog = (version, now + settings.QUESTION_CATALOG_TTL_SECONDS, etag, body)
+    return etag, body
@@ -1,106 +1,124 @@
 import os
+import stat
 import json
 from urllib.parse import quote
-from datetime import timezone
-from zoneinfo import ZoneInfo
-from sqlalchemy.orm import Session, selectinload
-from fastapi import APIRouter, Depends, UploadFile, File, Query
-from fastapi.responses import Response
-from app.database import get_db
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request, UploadFile, File, Query
+from fastapi.responses import StreamingResponse
+from app.database import SessionLocal, get_db
 from app.models import Music, TaggingTask, TaggingRecord, User
-from app.schemas import ApiResponse, MusicResponse, TaggingStatusEnum, UserRoleEnum, BizException
+from app.schemas import ApiResponse, MusicQualityEnum, MusicResponse, MusicSortEnum, SortOrderEnum, UserRoleEnum, BizException
+from app.analytics import update_analytics
+from app.audio_metadata import read_audio_metadata
 from app.auth import get_current_user
+from app.config import settings
+from app.ingest import iter_ingest, iter_scan
+from app.pagination import cached_count, paginate_by_cursor
+from app.preview import get_preview, preview_media_type, supports_preview
+from app.search import music_contains
+from app.serialization import api_response, format_datetime_to_shanghai
+from app.streaming import file_response, fileobj_response, is_not_modified, make_etag
 
 router = APIRouter()
 
-def format_datetime_to_shanghai(dt):
-    """将 datetime 对象转换为上海时区的字符串"""
-    if dt is None:
-        return None
-    # 如果 datetime 没有时区信息，假设它是 UTC
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    # 转换为上海时区
-    return dt.astimezone(ZoneInfo("Asia/Shanghai")).strftime("%Y-%m-%d %H:%M:%S")
-
 @router.post("/")
-async def create_music(
+def create_music(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """通过 JSON 文件上传音乐路径信息"""
+    """通过 JSON 文件上传音乐路径信息（JSON 数组或 JSON Lines，增量解析、分批导入）
+
+    每批导入后即提交，清单中途格式错误时返回已导入批次的结果，错误信息在 error 中
+    """
     if current_user.role != UserRoleEnum.ADMIN:
         raise BizException("无权限操作")
 
-    file_paths: list[str] = []
-    # 读取 JSON 文件内容
-    content = await file.read()
-    try:
-        data = json.loads(content.decode('utf-8'))
-        for file_path in data:
-            file_paths.append(file_path)
-    except json.JSONDecodeError as e:
-        raise BizException("JSON 文件格式错误")
-    
-    # 支持的音频格式
-    supported_formats = ['.mp3', '.wav']
-    
-    # 批量查询已存在的文件路径，避免逐条查询
-    existing_paths = set()
-    if file_paths:
-        existing_records = db.query(Music.filepath).filter(Music.filepath.in_(file_paths)).all()
-        existing_paths = {path[0] for path in existing_records}
-    
-    db_musics: list[Music] = []
-    error_paths: list[str] = []
-    
-    for filepath in file_paths:
-        # 检查是否已存在（使用批量查询的结果）
-        if filepath in existing_paths:
-            filename = os.path.splitext(os.path.basename(filepath))[0]
-            error_paths.append(f"{filepath} (文件已存在: {filename})")
-            continue
-        
-        # 验证文件格式
-        _, ext = os.path.splitext(filepath)
-        if ext.lower() not in supported_formats:
-            error_paths.append(f"{filepath} (不支持的格式: {ext})")
-            continue
-        
-        # 快速检查文件是否存在（不检查是否为文件，减少IO）
-        if not os.path.exists(filepath):
-            error_paths.append(f"{filepath} (文件不存在)")
-            continue
-        
-        # 获取文件名（不带扩展名）
-        filename = os.path.splitext(os.path.basename(filepath))[0]
-        
-        # 创建音乐记录
-        db_music = Music(
-            filepath=filepath,
-            filename=filename
-        )
-        db_musics.append(db_music)
-    
-    # 批量添加成功的音乐记录
-    if db_musics:
-        db.add_all(db_musics)
-        db.commit()
-        success_ids = [db_music.id for db_music in db_musics]
-    else:
-        success_ids = []
-    
-    # 返回结果，包含成功和错误信息
     result = {
-        "success_count": len(success_ids),
-        "error_count": len(error_paths),
-        "success_ids": success_ids,
-        "error_paths": error_paths
+        "success_count": 0,
+        "error_count": 0,
+        "success_ids": [],
+        "error_paths": [],
+        "error": None
     }
+    try:
+        for batch_result in iter_ingest(db, file.file):
+            result["success_count"] += batch_result["success_count"]
+            result["error_count"] += batch_result["error_count"]
+            result["success_ids"].extend(batch_result["success_ids"])
+            result["error_paths"].extend(batch_result["error_paths"])
+    except BizException as e:
+        result["error"] = e.error
     
     return ApiResponse.success_response(result)
 
+@router.post("/ingest")
+def ingest_music(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user)
+):
+    """流式导入大型音乐路径清单，逐批返回导入进度（JSON Lines）
+    - 每批一行：{"batch", "processed", "success_count", "error_count", "error_paths"}
+    - 最后一行为汇总：{"done": true, "success_count", "error_count"}，出错时为 {"done": true, "error"}
+    """
+    if current_user.role != UserRoleEnum.ADMIN:
+        raise BizException("无权限操作")
+
+    def iter_progress():
+        db = SessionLocal()
+        success_count = error_count = 0
+        try:
+            for batch, batch_result in enumerate(iter_ingest(db, file.file), start=1):
+                success_count += batch_result["success_count"]
+                error_count += batch_result["error_count"]
+                yield json.dumps({
+                    "batch": batch,
+                    "processed": success_count + error_count,
+                    "success_count": batch_result["success_count"],
+                    "error_count": batch_result["error_count"],
+                    "error_paths": batch_result["error_paths"]
+                }, ensure_ascii=False) + "\n"
+            yield json.dumps({"done": True, "success_count": success_count, "error_count": error_count}, ensure_ascii=False) + "\n"
+        except BizException as e:
+            yield json.dumps({"done": True, "error": e.error}, ensure_ascii=False) + "\n"
+        finally:
+            db.close()
+            file.file.close()
+
+    return StreamingResponse(iter_progress(), media_type="application/x-ndjson")
+
+@router.post("/scan")
+def scan_music(
+    full: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """扫描服务端配置的音乐目录（MUSIC_SCAN_ROOTS）导入新文件，逐批返回进度（JSON Lines）
+    - 默认增量扫描：只处理自上次扫描后修改过的目录中的文件
+    - full 为 True 时全量扫描（可发现原地修改内容的文件）
+    - 已注册的文件大小或修改时间变化时重新读取元数据，文件已不存在时清空元数据
+    - 每批一行：{"batch", "scanned_directories", "success_count", "updated_count", "missing_count", "missing_paths"}，
+      最后一行为汇总 {"done": true, ...}
+    """
+    if current_user.role != UserRoleEnum.ADMIN:
+        raise BizException("无权限操作")
+    if not settings.MUSIC_SCAN_ROOTS:
+        raise BizException("未配置音乐扫描目录")
+
+    def iter_progress():
+        db = SessionLocal()
+        summary = {"done": True, "scanned_directories": 0, "success_count": 0, "updated_count": 0, "missing_count": 0}
+        try:
+            for batch, batch_result in enumerate(iter_scan(db, settings.MUSIC_SCAN_ROOTS, full), start=1):
+                for key in ("scanned_directories", "success_count", "updated_count", "missing_count"):
+                    summary[key] += batch_result[key]
+                yield json.dumps({"batch": batch, **batch_result}, ensure_ascii=False) + "\n"
+            yield json.dumps(summary, ensure_ascii=False) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(iter_progress(), media_type="application/x-ndjson")
+
 @router.delete("/")
 def delete_music(
     id: int,
@@ -120,8 +138,9 @@ def delete_music(
     tasks = db.query(TaggingTask.id).filter(TaggingTask.music_id == id).all()
     task_ids = [task.id for task in tasks]
     
-    # 批量删除所有相关的打标记录（通过 task_id）
+    # 批量删除所有相关的打标记录（通过 task_id），删除前先从标注统计中扣除已审核通过的任务
     if task_ids:
+        update_analytics(db, TaggingTask.music_id == id, -1)
         db.query(TaggingRecord).filter(TaggingRecord.task_id.in_(task_ids)).delete()
     
     # 批量删除所有相关的打标任务
@@ -135,60 +154,95 @@ def delete_music(
 @router.get("/")
 def list_music(
     filepath: str | None = None,
+    min_valid_tagging_count: int | None = Query(None, ge=0),
+    max_valid_tagging_count: int | None = Query(None, ge=0),
+    sort_by: MusicSortEnum = MusicSortEnum.FILENAME,
+    sort_order: SortOrderEnum = SortOrderEnum.ASC,
     page: int | None = Query(None, ge=1),
     page_size: int | None = Query(None, ge=1, le=100),
+    cursor: str | None = None,
+    with_total: bool = False,
     db: Session = Depends(get_db)
 ):
     """获取音乐列表
+    - 如果提供了 cursor（第一页传空字符串），使用游标分页，按 (排序字段, id) 定位，返回 next_cursor
+      - with_total 为 True 时附带短期缓存的总数
     - 如果 page 或 page_size 为 None, 返回所有音乐(不分页)
     - 如果都提供了，返回分页结果
+    - 支持按有效打标数过滤，按文件名/有效打标数/创建时间排序
     """
-    query = db.query(Music).options(selectinload(Music.tagging_tasks))
+    query = db.query(Music)
     
-    # 如果有 filepath 搜索条件，添加过滤
+    # 如果有 filepath 搜索条件，添加过滤（SQLite 使用全文索引）
     if filepath:
-        query = query.filter(Music.filepath.like(f"%{filepath}%"))
+        query = query.filter(music_contains(db, "filepath", filepath))
+    if min_valid_tagging_count is not None:
+        query = query.filter(Music.valid_tagging_count >= min_valid_tagging_count)
+    if max_valid_tagging_count is not None:
+        query = query.filter(Music.valid_tagging_count <= max_valid_tagging_count)
+    
+    # 排序，以 id 作为第二排序键保证顺序稳定
+    sort_column = getattr(Music, sort_by.value)
+
+    # 游标分页
+    if cursor is not None:
+        page_size = page_size or 20
+        music_list, next_cursor = paginate_by_cursor(
+            query,
+            sort_key=f"{sort_by.value}:{sort_order.value}",
+            columns=[sort_column, Music.id],
+            descending=sort_order == SortOrderEnum.DESC,
+            cursor=cursor,
+            page_size=page_size
+        )
+        result = {
+            "items": [music_to_response(music) for music in music_list],
+            "next_cursor": next_cursor,
+            "page_size": page_size
+        }
+        if with_total:
+            result["total"] = cached_count(query, ("music", filepath, min_valid_tagging_count, max_valid_tagging_count))
+        return api_response(result)
+
+    if sort_order == SortOrderEnum.DESC:
+        order_by = (sort_column.desc(), Music.id.desc())
+    else:
+        order_by = (sort_column.asc(), Music.id.asc())
     
     # 如果不分页，返回所有音乐
     if page is None or page_size is None:
-        music_list = query.order_by(Music.filename.asc()).all()
-        return ApiResponse.success_response([music_to_response(music) for music in music_list])
+        music_list = query.order_by(*order_by).all()
+        return api_response([music_to_response(music) for music in music_list])
     
     # 分页查询
     total = query.count()
-    music_list = query.order_by(Music.filename.asc()).offset((page - 1) * page_size).limit(page_size).all()
+    music_list = query.order_by(*order_by).offset((page - 1) * page_size).limit(page_size).all()
     result = {
         "items": [music_to_response(music) for music in music_list],
         "total": total,
         "page": page,
         "page_size": page_size
     }
-    return ApiResponse.success_response(result)
+    return api_response(result)
 
-@router.get("/file")
+@router.api_route("/file", methods=["GET", "HEAD"])
 def get_music_file(
     path: str,
+    request: Request,
+    quality: MusicQualityEnum = MusicQualityEnum.ORIGINAL,
     db: Session = Depends(get_db)
 ):
-    """获取音乐文件（用于播放）"""
-    if not os.path.exists(path):
-        raise BizException("文件不存在")
-    
-    if not os.path.isfile(path):
-        raise BizException("路径不是文件")
-    
+    """获取音乐文件（用于播放，支持 Range 分段请求）
+
+    导入时已记录文件大小与修改时间的音乐，HEAD 请求与缓存仍然有效的条件请求（304）直接使用数据库中的元数据，
+    不访问文件系统；返回文件内容前检查文件，使用实际的大小与修改时间（与数据库不一致时更新记录）
+    - quality=preview: WAV 文件返回低码率预览版本（首次请求时转码并缓存），转码失败或其他格式返回原文件
+    """
     # 验证文件是否在数据库中
     music = db.query(Music).filter(Music.filepath == path).first()
     if not music:
         raise BizException("音乐文件未注册")
     
-    # 返回文件
-    try:
-        with open(path, 'rb') as f:
-            content = f.read()
-    except Exception as e:
-        raise BizException(f"读取文件失败: {str(e)}")
-    
     # 根据文件扩展名确定媒体类型
     _, ext = os.path.splitext(path)
     media_type = "audio/mpeg" if ext.lower() == ".mp3" else "audio/wav"
@@ -196,20 +250,69 @@ def get_music_file(
     # 编码文件名以支持中文字符（使用 RFC 5987 格式）
     filename = os.path.basename(path)
     encoded_filename = quote(filename, safe='')
+    headers = {
+        "Content-Disposition": f"inline; filename*=UTF-8''{encoded_filename}"
+    }
+
+    if quality == MusicQualityEnum.PREVIEW and supports_preview(path):
+        # 预览版本按源文件实际的修改时间缓存，源文件修改后生成新版本
+        stat_result = stat_music_file(db, music)
+        try:
+            preview_file = get_preview(path, stat_result.st_mtime)
+        except Exception:
+            preview_file = None
+        if preview_file is not None:
+            return fileobj_response(request, preview_file, media_type=preview_media_type(), headers=headers)
+
+    if music.file_size is not None and music.file_mtime is not None:
+        etag = make_etag(music.file_size, music.file_mtime)
+        if request.method == "HEAD" or is_not_modified(request, etag, music.file_mtime):
+            return file_response(
+                request, path, media_type=media_type, headers=headers, size=music.file_size, mtime=music.file_mtime
+            )
     
-    return Response(
-        content=content,
-        media_type=media_type,
-        headers={
-            "Content-Disposition": f"inline; filename*=UTF-8''{encoded_filename}"
-        }
+    # 流式返回文件，避免整文件读入内存
+    stat_result = stat_music_file(db, music)
+    return file_response(
+        request, path, media_type=media_type, headers=headers, size=stat_result.st_size, mtime=stat_result.st_mtime
+    )
+
+def stat_music_file(db: Session, music: Music) -> os.stat_result:
+    """检查音乐文件是否存在并返回文件状态，大小或修改时间与数据库记录不一致时重新读取元数据并更新记录"""
+    try:
+        stat_result = os.stat(music.filepath)
+    except FileNotFoundError:
+        raise BizException("文件不存在")
+    except OSError as e:
+        raise BizException(f"读取文件失败: {str(e)}")
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise BizException("路径不是文件")
+
+    if music.file_size != stat_result.st_size or music.file_mtime != stat_result.st_mtime:
+        metadata = read_audio_metadata(music.filepath)
+        if metadata:
+            for key, value in metadata.items():
+                setattr(music, key, value)
+            db.commit()
+    return stat_result
+
+def update_valid_tagging_count(db: Session, music_id: int, delta: int):
+    """增量更新音乐的有效打标数（在数据库中原子执行，随调用方事务提交）"""
+    db.query(Music).filter(Music.id == music_id).update(
+        {Music.valid_tagging_count: func.coalesce(Music.valid_tagging_count, 0) + delta},
+        synchronize_session=False
     )
 
 def music_to_response(music: Music) -> MusicResponse:
-    return MusicResponse(
+    return MusicResponse.model_construct(
         id=music.id,
         filepath=music.filepath,
         filename=music.filename,
-        valid_tagging_count=sum(1 for task in music.tagging_tasks if task.status == TaggingStatusEnum.REVIEWED),
+        valid_tagging_count=music.valid_tagging_count or 0,
+        file_size=music.file_size,
+        duration=music.duration,
+        sample_rate=music.sample_rate,
+        channels=music.channels,
+        bitrate=music.bitrate,
         create_time=format_datetime_to_shanghai(music.create_time)
     )
@@ -1,26 +1,15 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy import or_
 from sqlalchemy.orm import Session
-from datetime import timezone
-from zoneinfo import ZoneInfo
 from app.schemas import BizException
 from app.database import get_db
 from app.models import User
 from app.schemas import ApiResponse, UserCreate, UserLogin, UserResponse, UserRoleEnum
 from app.auth import get_current_user, create_access_token
+from app.serialization import api_response, format_datetime_to_shanghai
 
 router = APIRouter()
 
-def format_datetime_to_shanghai(dt):
-    """将 datetime 对象转换为上海时区的字符串"""
-    if dt is None:
-        return None
-    # 如果 datetime 没有时区信息，假设它是 UTC
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    # 转换为上海时区
-    return dt.astimezone(ZoneInfo("Asia/Shanghai")).strftime("%Y-%m-%d %H:%M:%S")
-
 @router.post("/register")
 def register(user: UserCreate, db: Session = Depends(get_db)):
     """注册用户"""
@@ -66,10 +55,10 @@ def list_users(
     if role:
         query = query.filter(User.role == role)
     users = query.order_by(User.username.asc()).all()
-    return ApiResponse.success_response([user_to_response(user) for user in users])
+    return api_response([user_to_response(user) for user in users])
 
 def user_to_response(user: User) -> UserResponse:
-    return UserResponse(
+    return UserResponse.model_construct(
         id=user.id,
         username=user.username,
         role=user.role,
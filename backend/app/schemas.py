@@ -1,3 +1,4 @@
+from datetime import datetime
 from enum import Enum
 from pydantic import BaseModel
 from typing import Any
@@ -64,6 +65,53 @@ class TaggingStatusEnum(Enum):
     REJECTED = "rejected"  # 审核未通过
 
 
+class MusicSortEnum(Enum):
+    """音乐列表排序字段"""
+    FILENAME = "filename"
+    VALID_TAGGING_COUNT = "valid_tagging_count"
+    CREATE_TIME = "create_time"
+
+
+class MusicQualityEnum(Enum):
+    """音乐文件播放质量"""
+    ORIGINAL = "original"  # 原始文件
+    PREVIEW = "preview"  # 低码率预览版本
+
+
+class SortOrderEnum(Enum):
+    """排序方向"""
+    ASC = "asc"
+    DESC = "desc"
+
+
+class TaskListViewEnum(Enum):
+    """打标任务列表返回格式"""
+    FULL = "full"  # 每个任务内嵌音乐、用户与题目的完整信息
+    COMPACT = "compact"  # 任务中只保留 id，音乐、用户与题目放在去重后的附表中
+
+
+class AssignPolicyEnum(Enum):
+    """批量分配打标任务的策略"""
+    ROUND_ROBIN = "round_robin"  # 轮流分配
+    LEAST_LOADED = "least_loaded"  # 优先分配给未完成任务最少的人
+
+
+class ExportFormatEnum(Enum):
+    """打标记录导出格式"""
+    JSON = "json"  # 以 filepath 为键的嵌套 JSON
+    JSONL = "jsonl"  # 每行一条 (音乐, 题目, 打标员) 记录
+    CSV = "csv"  # 每行一条 (音乐, 题目, 打标员) 记录
+    COLUMNAR = "columnar"  # 列式，选项编码为题目选项下标
+
+
+class ExportJobStatusEnum(Enum):
+    """后台导出任务状态"""
+    PENDING = "pending"  # 排队中
+    RUNNING = "running"  # 导出中
+    SUCCEEDED = "succeeded"  # 已完成
+    FAILED = "failed"  # 失败
+
+
 class UserCreate(BaseModel):
     username: str
     password: str
@@ -87,6 +135,11 @@ class MusicResponse(BaseModel):
     filepath: str
     filename: str
     valid_tagging_count: int
+    file_size: int | None = None
+    duration: float | None = None
+    sample_rate: int | None = None
+    channels: int | None = None
+    bitrate: int | None = None
     create_time: str
 
 
@@ -113,12 +166,25 @@ class TaggingRecordUpdate(BaseModel):
     selected_options: list[str]
 
 
+class TaggingRecordBatchUpdate(BaseModel):
+    task_id: int
+    records: list[TaggingRecordUpdate]
+    finish: bool = False  # 是否同时完成打标任务
+
+
 class TaggingRecordResponse(BaseModel):
     id: int
+    question_id: int
     question: TaggingQuestionResponse
     selected_options: list[str]
 
 
+class TaggingRecordCompactResponse(BaseModel):
+    id: int
+    question_id: int
+    selected_options: list[str]
+
+
 class TaggingTaskOperate(BaseModel):
     operation: OperationEnum
     id: int | None = None
@@ -130,6 +196,16 @@ class TaggingTaskOperate(BaseModel):
     review_comment: str | None = None
 
 
+class TaggingTaskBulkCreate(BaseModel):
+    music_ids: list[int] | None = None  # 与 filepath_prefix 二选一
+    filepath_prefix: str | None = None
+    question_ids: list[int]
+    tagger_ids: list[int]
+    reviewer_ids: list[int]
+    policy: AssignPolicyEnum = AssignPolicyEnum.ROUND_ROBIN
+    redundancy: int = 1  # 每首音乐分配给几个不同的打标员
+
+
 class TaggingTaskResponse(BaseModel):
     id: int
     music: MusicResponse
@@ -141,3 +217,75 @@ class TaggingTaskResponse(BaseModel):
     creator: UserResponse
     create_time: str
     records: list[TaggingRecordResponse]
+
+
+class TaggingTaskCompactResponse(BaseModel):
+    """精简格式的打标任务，音乐、用户与题目通过 id 引用附表"""
+    id: int
+    music_id: int
+    status: TaggingStatusEnum
+    tagger_id: int
+    tagging_time: str | None = None
+    reviewer_id: int | None = None
+    review_time: str | None = None
+    creator_id: int
+    create_time: str
+    records: list[TaggingRecordCompactResponse]
+
+
+class ExportFilter(BaseModel):
+    """打标记录导出条件"""
+    music_ids: list[int] | None = None  # 为空时按条件导出所有音乐
+    filepath_prefix: str | None = None
+    status: TaggingStatusEnum = TaggingStatusEnum.REVIEWED
+    start_time: datetime | None = None  # 审核时间范围（上海时间）
+    end_time: datetime | None = None
+    question_ids: list[int] | None = None
+
+
+class ExportJobCreate(ExportFilter):
+    format: ExportFormatEnum = ExportFormatEnum.JSON
+
+
+class ExportJobResponse(BaseModel):
+    id: int
+    status: ExportJobStatusEnum
+    format: ExportFormatEnum
+    progress: int
+    total: int | None = None
+    file_size: int | None = None
+    error: str | None = None
+    create_time: str
+    finish_time: str | None = None
+
+
+class OptionCountResponse(BaseModel):
+    option: str
+    count: int
+
+
+class QuestionStatResponse(BaseModel):
+    """题目各选项在已审核通过任务中被选择的次数（按题目选项顺序，已不在题目选项中的历史选项排在最后）"""
+    question_id: int
+    title: str
+    options: list[OptionCountResponse]
+
+
+class TaggerStatResponse(BaseModel):
+    tagger_id: int
+    username: str | None = None
+    reviewed_count: int
+
+
+class QuestionAgreementResponse(BaseModel):
+    question_id: int
+    agreement: float  # 多数答案占比
+    answer: list[str]  # 多数答案
+
+
+class MusicAgreementResponse(BaseModel):
+    music_id: int
+    filepath: str | None = None
+    tagger_count: int  # 已审核通过的任务数
+    agreement: float  # 各题多数答案占比的平均值
+    questions: list[QuestionAgreementResponse]
@@ -0,0 +1,99 @@
+"""关键字搜索
+
+音乐路径 / 文件名、用户名的 LIKE '%关键字%' 搜索无法使用普通 B 树索引：
+- SQLite：使用 FTS5 trigram 分词的外部内容全文索引表（music_fts、users_fts），由触发器在插入 / 更新 / 删除时同步，
+  关键字不少于 3 个字符时先在全文索引中查找匹配的 id（三元组索引无法匹配更短的关键字，仍逐行 LIKE）
+  文件名是路径的一部分，音乐只索引 filepath，按文件名搜索时在路径匹配的音乐中再过滤文件名
+- PostgreSQL：pg_trgm 三元组 GIN 索引（见 models.trigram_index）直接支持 LIKE / ILIKE，无需改写查询；
+  使用 ILIKE 与 SQLite 一样不区分大小写
+"""
+from functools import lru_cache
+from sqlalchemy import Integer, and_, column, select, table, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from app.models import Music, User
+
+# 三元组索引可匹配的最短关键字
+SEARCH_INDEX_MIN_LENGTH = 3
+
+# 全文索引表：(表名, 内容表, 索引的列)
+FTS_TABLES = [
+    ("music_fts", "music", ["filepath"]),
+    ("users_fts", "users", ["username"]),
+]
+
+music_fts = table("music_fts", column("rowid", Integer), column("filepath"))
+users_fts = table("users_fts", column("rowid", Integer), column("username"))
+
+
+def fts5_trigram_supported(conn: Connection) -> bool:
+    """SQLite 是否支持 FTS5 trigram 分词（3.34 起）"""
+    fts5, version = conn.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5'), sqlite_version()")).one()
+    return bool(fts5) and tuple(int(part) for part in version.split(".")) >= (3, 34)
+
+
+def create_search_index(conn: Connection):
+    """SQLite：创建全文索引表及同步触发器，并根据现有数据重建索引（其他数据库或不支持时无操作）"""
+    if conn.dialect.name != "sqlite" or not fts5_trigram_supported(conn):
+        return
+    for fts_name, content_table, columns in FTS_TABLES:
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"new.{name}" for name in columns)
+        old_values = ", ".join(f"old.{name}" for name in columns)
+        insert_new = f"INSERT INTO {fts_name}(rowid, {column_list}) VALUES (new.id, {new_values});"
+        delete_old = f"INSERT INTO {fts_name}({fts_name}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});"
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_name} USING fts5("
+            f"{column_list}, content='{content_table}', content_rowid='id', tokenize='trigram')"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_name}_ai AFTER INSERT ON {content_table} BEGIN {insert_new} END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_name}_ad AFTER DELETE ON {content_table} BEGIN {delete_old} END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {fts_name}_au AFTER UPDATE OF {column_list} ON {content_table} "
+            f"BEGIN {delete_old} {insert_new} END"
+        ))
+        conn.execute(text(f"INSERT INTO {fts_name}({fts_name}) VALUES ('rebuild')"))
+
+
+@lru_cache
+def search_index_exists(engine: Engine) -> bool:
+    """数据库中是否已创建全文索引表"""
+    if engine.dialect.name != "sqlite":
+        return False
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'music_fts'")).first() is not None
+
+
+def use_search_index(db: Session, keyword: str) -> bool:
+    """关键字能否通过全文索引查找"""
+    return len(keyword) >= SEARCH_INDEX_MIN_LENGTH and search_index_exists(db.get_bind())
+
+
+def contains(db: Session, target, pattern: str):
+    """不使用全文索引时的 LIKE 条件"""
+    if db.get_bind().dialect.name == "postgresql":
+        return target.ilike(pattern)
+    return target.like(pattern)
+
+
+def music_contains(db: Session, column_name: str, keyword: str):
+    """音乐的 filepath / filename 包含关键字的过滤条件"""
+    pattern = f"%{keyword}%"
+    if use_search_index(db, keyword):
+        condition = Music.id.in_(select(music_fts.c.rowid).where(music_fts.c.filepath.like(pattern)))
+        if column_name == "filename":
+            condition = and_(condition, Music.filename.like(pattern))
+        return condition
+    return contains(db, getattr(Music, column_name), pattern)
+
+
+def user_contains(db: Session, keyword: str):
+    """用户名包含关键字的过滤条件"""
+    pattern = f"%{keyword}%"
+    if use_search_index(db, keyword):
+        return User.id.in_(select(users_fts.c.rowid).where(users_fts.c.username.like(pattern)))
+    return contains(db, User.username, pattern)
@@ -0,0 +1,57 @@
+"""响应序列化
+
+路由返回的数据都由 ORM 对象转换而来，字段类型可信：
+- 响应模型使用 model_construct 构造，跳过 Pydantic 校验
+- 列表等大响应通过 api_response() 直接用 orjson 序列化，不经过 FastAPI 的 jsonable_encoder
+  （逐字段递归复制为字典，是大列表响应的主要开销）
+- 时间统一转换为上海时区字符串，时区对象只创建一次，并缓存最近的转换结果
+  （同一页中的用户、音乐、题目时间大量重复）
+"""
+from datetime import datetime, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+import orjson
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from app.schemas import ApiResponse
+
+SHANGHAI_TZ = ZoneInfo("Asia/Shanghai")
+
+
+@lru_cache(maxsize=65536)
+def _format_shanghai(dt: datetime) -> str:
+    # 如果 datetime 没有时区信息，假设它是 UTC
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(SHANGHAI_TZ).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def format_datetime_to_shanghai(dt: datetime | None) -> str | None:
+    """将 datetime 对象转换为上海时区的字符串"""
+    if dt is None:
+        return None
+    return _format_shanghai(dt)
+
+
+def _default(obj):
+    """orjson 无法直接序列化的对象：Pydantic 模型按字段序列化（枚举、嵌套模型由 orjson 继续处理）"""
+    if isinstance(obj, BaseModel):
+        return obj.__dict__
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dump_json(content) -> bytes:
+    """序列化为 JSON 字节串，支持 Pydantic 模型"""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class ApiJSONResponse(ORJSONResponse):
+    """可直接渲染 Pydantic 模型的 orjson 响应"""
+
+    def render(self, content) -> bytes:
+        return dump_json(content)
+
+
+def api_response(data=None) -> ApiJSONResponse:
+    """成功响应，与 ApiResponse.success_response(data) 的内容一致"""
+    return ApiJSONResponse(ApiResponse.success_response(data))
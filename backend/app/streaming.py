@@ -0,0 +1,184 @@
+import os
+from collections.abc import Callable, Iterator
+from typing import BinaryIO
+from email.utils import formatdate, parsedate_to_datetime
+from fastapi import Request
+from fastapi.responses import Response, StreamingResponse
+
+# 每次读取的块大小
+CHUNK_SIZE = 64 * 1024
+
+
+def read_file_range(f: BinaryIO, start: int, end: int, chunk_size: int = CHUNK_SIZE):
+    """按块读取已打开文件 [start, end] 区间的内容"""
+    f.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = f.read(min(chunk_size, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def iter_file_range(path: str, start: int, end: int, chunk_size: int = CHUNK_SIZE):
+    """按块读取文件 [start, end] 区间的内容"""
+    with open(path, 'rb') as f:
+        yield from read_file_range(f, start, end, chunk_size)
+
+
+def iter_fileobj_range(fileobj: BinaryIO, start: int, end: int, chunk_size: int = CHUNK_SIZE):
+    """按块读取已打开文件 [start, end] 区间的内容，读取结束（或客户端断开）后关闭文件"""
+    with fileobj:
+        yield from read_file_range(fileobj, start, end, chunk_size)
+
+
+def make_etag(size: int, mtime: float) -> str:
+    """根据文件大小和修改时间生成强 ETag"""
+    return f'"{int(mtime * 1000000):x}-{size:x}"'
+
+
+def parse_range(range_header: str, size: int) -> tuple[int, int] | None:
+    """解析 Range 请求头，仅支持单个区间
+
+    - 返回 (start, end)，均为闭区间
+    - 请求头语法无效（如 bytes=5-3）或为多区间时返回 None，按 RFC 9110 忽略 Range，返回完整文件
+    - 语法有效但无法满足（起始位置超出文件大小、bytes=-0）时抛出 ValueError（416）
+    """
+    unit, _, ranges = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or not ranges or "," in ranges:
+        return None
+    start_str, sep, end_str = ranges.strip().partition("-")
+    if not sep:
+        return None
+    start_str, end_str = start_str.strip(), end_str.strip()
+    if not (start_str or end_str) or not all(part.isdigit() for part in (start_str, end_str) if part):
+        return None
+
+    if start_str == "":
+        # 后缀区间：bytes=-500 表示最后 500 字节
+        suffix_length = int(end_str)
+        if suffix_length == 0:
+            raise ValueError("区间无效")
+        return max(size - suffix_length, 0), size - 1
+
+    start = int(start_str)
+    if end_str and start > int(end_str):
+        return None
+    if start >= size:
+        raise ValueError("区间无效")
+    end = min(int(end_str), size - 1) if end_str else size - 1
+    return start, end
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match 中是否包含当前 ETag"""
+    tags = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    """根据 If-None-Match / If-Modified-Since 判断客户端缓存是否仍然有效"""
+    if request.headers.get("if-none-match") is not None:
+        return etag_matches(request, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(mtime) <= since
+    return False
+
+
+def file_response(
+    request: Request,
+    path: str,
+    media_type: str,
+    headers: dict[str, str] | None = None,
+    size: int | None = None,
+    mtime: float | None = None
+) -> Response:
+    """以流式方式返回文件，支持 Range / 206、ETag / Last-Modified 与条件请求
+
+    - size 与 mtime 未提供时通过 os.stat 获取
+    """
+    if size is None or mtime is None:
+        stat_result = os.stat(path)
+        size, mtime = stat_result.st_size, stat_result.st_mtime
+    return _file_response(request, media_type, headers, size, mtime, lambda start, end: iter_file_range(path, start, end))
+
+
+def fileobj_response(
+    request: Request,
+    fileobj: BinaryIO,
+    media_type: str,
+    headers: dict[str, str] | None = None
+) -> Response:
+    """与 file_response 相同，但从已打开的文件读取（文件之后被删除也不影响本次响应）
+
+    - fileobj 由本函数负责关闭：流式返回时读取结束后关闭，304 / 416 / HEAD 时立即关闭
+    """
+    stat_result = os.fstat(fileobj.fileno())
+    response = _file_response(
+        request, media_type, headers, stat_result.st_size, stat_result.st_mtime,
+        lambda start, end: iter_fileobj_range(fileobj, start, end)
+    )
+    if not isinstance(response, StreamingResponse):
+        fileobj.close()
+    return response
+
+
+def _file_response(
+    request: Request,
+    media_type: str,
+    headers: dict[str, str] | None,
+    size: int,
+    mtime: float,
+    iter_range: Callable[[int, int], Iterator[bytes]]
+) -> Response:
+    """根据文件大小、修改时间与请求头构造响应，iter_range(start, end) 返回区间内容"""
+    etag = make_etag(size, mtime)
+    response_headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": formatdate(mtime, usegmt=True),
+        **(headers or {})
+    }
+
+    # 条件请求：客户端缓存仍然有效
+    if is_not_modified(request, etag, mtime):
+        return Response(status_code=304, headers=response_headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range 与当前版本不一致时忽略 Range，返回完整文件
+    if range_header and if_range and if_range.strip() not in (etag, response_headers["Last-Modified"]):
+        range_header = None
+
+    byte_range = None
+    if range_header and size > 0:
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={**response_headers, "Content-Range": f"bytes */{size}"}
+            )
+
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        (start, end), status_code = byte_range, 206
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response_headers["Content-Length"] = str(end - start + 1)
+
+    if request.method == "HEAD":
+        return Response(status_code=status_code, media_type=media_type, headers=response_headers)
+
+    return StreamingResponse(
+        iter_range(start, end),
+        status_code=status_code,
+        media_type=media_type,
+        headers=response_headers
+    )
@@ -0,0 +1,99 @@
+"""测试辅助函数"""
+import json
+import os
+import wave
+from sqlalchemy import event
+
+
+def login(client, username: str, role: str) -> dict:
+    """注册（已存在时跳过）并登录，返回认证请求头"""
+    client.post("/user/register", json={"username": username, "password": "password", "role": role})
+    token = client.post("/user/login", json={"username": username, "password": "password"}).json()["data"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def write_wav(path: str, frames: int = 8000, channels: int = 1, sample_rate: int = 8000, sample: bytes = b"\0\0"):
+    """写入 16 位 PCM WAV 文件"""
+    with wave.open(path, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(sample * channels * frames)
+
+
+def create_wav_files(directory, count: int, prefix: str = "music") -> list[str]:
+    """在目录中创建 count 个 WAV 文件，返回路径"""
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"{prefix}_{i}.wav")
+        write_wav(path)
+        paths.append(path)
+    return paths
+
+
+def import_music(client, admin: dict, paths: list[str]) -> list[int]:
+    """通过路径清单导入音乐，返回新音乐 id"""
+    response = client.post("/music/", headers=admin, files={"file": ("music.json", json.dumps(paths))}).json()
+    return response["data"]["success_ids"]
+
+
+def create_task(client, admin: dict, music_id: int, question_ids: list[int], tagger_id: int, reviewer_id: int) -> int:
+    """创建打标任务，返回任务 id"""
+    response = client.post("/tagging/task/operate", headers=admin, json={
+        "operation": "create",
+        "music_id": music_id,
+        "question_ids": question_ids,
+        "tagger_id": tagger_id,
+        "reviewer_id": reviewer_id
+    }).json()
+    assert response["success"], response
+    return response["data"]
+
+
+def get_task(client, task_id: int) -> dict:
+    """按 id 获取任务（在任务列表中查找）"""
+    cursor = ""
+    while cursor is not None:
+        data = client.get("/tagging/task/list", params={"cursor": cursor, "page_size": 100}).json()["data"]
+        for task in data["items"]:
+            if task["id"] == task_id:
+                return task
+        cursor = data["next_cursor"]
+    raise AssertionError(f"任务不存在: {task_id}")
+
+
+def complete_task(client, task_id: int, tagger: dict, reviewer: dict, option_index: int = 0, review_result: str = "agreed"):
+    """打标（每题选择第 option_index 个选项）、完成并审核任务"""
+    task = get_task(client, task_id)
+    response = client.post("/tagging/tag/batch", headers=tagger, json={
+        "task_id": task_id,
+        "finish": True,
+        "records": [
+            {"id": record["id"], "selected_options": [record["question"]["options"][option_index]]}
+            for record in task["records"]
+        ]
+    }).json()
+    assert response["success"], response
+    response = client.post("/tagging/task/operate", headers=reviewer, json={
+        "operation": "review",
+        "id": task_id,
+        "review_result": review_result
+    }).json()
+    assert response["success"], response
+
+
+def count_statements(func):
+    """执行 func，返回 (结果, 执行的 SQL 语句数)"""
+    from app.database import engine
+
+    statements = []
+
+    def on_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", on_execute)
+    try:
+        result = func()
+    finally:
+        event.remove(engine, "before_cursor_execute", on_execute)
+    return result, len(statements)
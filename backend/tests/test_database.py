@@ -0,0 +1,78 @@
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.schema import CreateIndex
+
+
+def model_indexes() -> dict:
+    from app.database import Base
+
+    return {index.name: index for table in Base.metadata.tables.values() for index in table.indexes}
+
+
+def index_names(conn, table_names: set[str]) -> set[str]:
+    inspector = inspect(conn)
+    return {index["name"] for table_name in table_names for index in inspector.get_indexes(table_name)}
+
+
+def test_migration_indexes_match_models():
+    """迁移中冻结的索引定义与当前模型一致（模型变更索引时需要新增迁移）"""
+    from app.migrations import FILTER_INDEXES, POSTGRESQL_INDEXES, SEARCH_INDEXES
+
+    indexes = model_indexes()
+    for index in FILTER_INDEXES + POSTGRESQL_INDEXES + SEARCH_INDEXES:
+        for dialect in (sqlite.dialect(), postgresql.dialect()):
+            assert str(CreateIndex(index).compile(dialect=dialect)) == str(CreateIndex(indexes[index.name]).compile(dialect=dialect))
+
+
+def test_rerun_migrations_restores_indexes(client):
+    """删除索引并清空版本记录后重新执行全部迁移，恢复到与新建数据库相同的索引"""
+    from app.database import engine
+    from app.migrations import FILTER_INDEXES, MIGRATIONS, POSTGRESQL_INDEXES, SEARCH_INDEXES, run_migrations, schema_version_table
+
+    indexes = FILTER_INDEXES + POSTGRESQL_INDEXES + SEARCH_INDEXES
+    table_names = {index.table.name for index in indexes}
+    with engine.connect() as conn:
+        expected = index_names(conn, table_names)
+    assert {index.name for index in FILTER_INDEXES + SEARCH_INDEXES} <= expected
+
+    with engine.begin() as conn:
+        for index in indexes:
+            index.drop(conn, checkfirst=True)
+        assert not expected & {index.name for index in indexes} & index_names(conn, table_names)
+        conn.execute(schema_version_table.delete())
+    assert run_migrations(engine) == [version for version, _, _ in MIGRATIONS]
+    assert run_migrations(engine) == []
+    with engine.connect() as conn:
+        assert index_names(conn, table_names) == expected
+
+
+@pytest.fixture
+def pg_conn(client):
+    from app.database import engine
+
+    if engine.dialect.name != "postgresql":
+        pytest.skip("需要 PostgreSQL（设置 TEST_DATABASE_URL）")
+    with engine.begin() as conn:
+        yield conn
+
+
+def test_postgresql_schema(pg_conn):
+    inspector = inspect(pg_conn)
+    for table_name, column_name in [("tagging_questions", "options"), ("tagging_records", "selected_options")]:
+        column = next(column for column in inspector.get_columns(table_name) if column["name"] == column_name)
+        assert isinstance(column["type"], postgresql.JSONB)
+    assert "ix_tagging_records_selected_options" in index_names(pg_conn, {"tagging_records"})
+
+
+def test_postgresql_trigram_index(pg_conn):
+    from app.database import pg_trgm_installed
+
+    if not pg_trgm_installed(None, None, pg_conn):
+        pytest.skip("PostgreSQL 未安装 pg_trgm 扩展")
+    assert {"ix_users_username_trgm", "ix_music_filepath_trgm", "ix_music_filename_trgm"} <= index_names(pg_conn, {"users", "music"})
+
+    # 禁用顺序扫描后，包含匹配（ILIKE '%关键字%'）可以使用三元组索引
+    pg_conn.execute(text("SET LOCAL enable_seqscan = off"))
+    plan = "\n".join(pg_conn.execute(text("EXPLAIN SELECT id FROM music WHERE filepath ILIKE :keyword"), {"keyword": "%keyword%"}).scalars())
+    assert "ix_music_filepath_trgm" in plan
@@ -0,0 +1,217 @@
+import csv
+import io
+import json
+import os
+import time
+from helpers import complete_task, create_task, create_wav_files, import_music
+
+
+def create_tasks(client, admin, user_ids, questions, tmp_path, count: int) -> tuple[list[str], list[int], list[int]]:
+    """导入 count 首音乐并各创建一个任务，返回 (路径, 音乐 id, 任务 id)"""
+    paths = create_wav_files(tmp_path, count)
+    music_ids = import_music(client, admin, paths)
+    task_ids = [
+        create_task(client, admin, music_id, questions, user_ids["tagger"], user_ids["reviewer"])
+        for music_id in music_ids
+    ]
+    return paths, music_ids, task_ids
+
+
+def download(client, admin, **params):
+    response = client.get("/tagging/download", headers=admin, params=params)
+    assert response.status_code == 200
+    return response
+
+
+def test_download_json(client, admin, tagger, reviewer, user_ids, questions, tmp_path):
+    paths, music_ids, task_ids = create_tasks(client, admin, user_ids, questions, tmp_path, 3)
+    complete_task(client, task_ids[0], tagger, reviewer)
+
+    # 导出指定的音乐（默认只包含已审核通过任务的记录），不存在的音乐 id 忽略
+    response = download(client, admin, music_ids=music_ids + [999999])
+    data = json.loads(response.text)
+    assert response.text == json.dumps(data, ensure_ascii=False, indent=2)
+    assert data == [
+        {paths[0]: {"测试单选题": {"tagger": ["a"]}, "测试多选题": {"tagger": ["x"]}}},
+        {paths[1]: {}},
+        {paths[2]: {}}
+    ]
+    assert download(client, admin, music_ids=[999999]).text == "[]"
+
+
+def test_download_formats(client, admin, tagger, reviewer, user_ids, questions, tmp_path):
+    paths, music_ids, task_ids = create_tasks(client, admin, user_ids, questions, tmp_path, 2)
+    complete_task(client, task_ids[0], tagger, reviewer, option_index=1)
+
+    lines = [json.loads(line) for line in download(client, admin, music_ids=music_ids, format="jsonl").text.splitlines()]
+    assert {(line["filepath"], line["question"], line["tagger"]) for line in lines} == {
+        (paths[0], "测试单选题", "tagger"), (paths[0], "测试多选题", "tagger")
+    }
+    assert {tuple(line["selected_options"]) for line in lines} == {("b",), ("y",)}
+    assert all(line["option_indices"] == [1] for line in lines)
+
+    response = download(client, admin, music_ids=music_ids, format="csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 2 and {row["selected_options"] for row in rows} == {'["b"]', '["y"]'}
+    assert all(row["option_indices"] == "[1]" for row in rows)
+    assert ".csv" in response.headers["content-disposition"]
+
+    response = download(client, admin, music_ids=music_ids, format="columnar")
+    header, batch = [json.loads(line) for line in response.text.splitlines()]
+    assert header["questions"][str(questions[1])] == {"title": "测试多选题", "options": ["x", "y", "z"]}
+    assert batch["music"] == {str(music_id): path for music_id, path in zip(music_ids, paths)}
+    assert batch["option_codes"] == [[1], [1]]
+    assert "columnar.jsonl" in response.headers["content-disposition"]
+
+
+def test_download_csv_options_with_separator(client, admin, tagger, reviewer, user_ids, tmp_path):
+    response = client.post("/tagging/question/operate", headers=admin, json={
+        "operation": "create",
+        "title": "测试含分隔符的选项",
+        "description": "",
+        "is_multiple_choice": True,
+        "options": ["a|b", "c", "a", "b"]
+    }).json()
+    question_id = response["data"]
+    paths, music_ids, task_ids = create_tasks(client, admin, user_ids, [question_id], tmp_path, 1)
+    complete_task(client, task_ids[0], tagger, reviewer)
+
+    rows = list(csv.DictReader(io.StringIO(download(client, admin, music_ids=music_ids, format="csv").text)))
+    assert len(rows) == 1
+    assert json.loads(rows[0]["selected_options"]) == ["a|b"]
+    assert json.loads(rows[0]["option_indices"]) == [0]
+
+
+def test_download_filters(client, admin, tagger, reviewer, user_ids, questions, tmp_path):
+    paths, music_ids, task_ids = create_tasks(client, admin, user_ids, questions, tmp_path, 3)
+    complete_task(client, task_ids[1], tagger, reviewer)
+    prefix = os.path.join(tmp_path, "")
+
+    # 未指定 music_ids 时只导出存在符合条件任务的音乐
+    assert [list(item) for item in json.loads(download(client, admin, filepath_prefix=prefix).text)] == [[paths[1]]]
+    assert len(json.loads(download(client, admin, filepath_prefix=prefix, status="pending").text)) == 2
+    lines = [
+        json.loads(line)
+        for line in download(client, admin, filepath_prefix=prefix, format="jsonl", question_ids=[questions[0]]).text.splitlines()
+    ]
+    assert [(line["music_id"], line["question_id"]) for line in lines] == [(music_ids[1], questions[0])]
+    assert download(client, admin, filepath_prefix=prefix, start_time="2100-01-01T00:00:00").text == "[]"
+    assert len(json.loads(download(client, admin, filepath_prefix=prefix, end_time="2100-01-01T00:00:00").text)) == 1
+
+
+def wait_export_job(client, admin, job_id: int) -> dict:
+    for _ in range(100):
+        job = client.get("/tagging/export/job", headers=admin, params={"id": job_id}).json()["data"]
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"导出任务未结束: {job}")
+
+
+def test_export_job(client, admin, tagger, reviewer, user_ids, questions, tmp_path):
+    _, _, task_ids = create_tasks(client, admin, user_ids, questions, tmp_path, 3)
+    complete_task(client, task_ids[1], tagger, reviewer)
+    response = client.post("/tagging/export/job", headers=admin, json={
+        "filepath_prefix": os.path.join(tmp_path, ""),
+        "format": "jsonl"
+    }).json()
+    assert response["success"], response
+    job = wait_export_job(client, admin, response["data"])
+    assert job["status"] == "succeeded", job
+    assert job["progress"] == job["total"] == 1
+
+    response = client.get("/tagging/export/job/file", headers=admin, params={"id": job["id"]})
+    assert len(response.text.splitlines()) == 2
+    partial = client.get("/tagging/export/job/file", headers={**admin, "Range": "bytes=0-9"}, params={"id": job["id"]})
+    assert partial.status_code == 206 and partial.content == response.content[:10]
+    assert client.get("/tagging/export/job", headers=admin, params={"id": 999999}).json()["error"] == "导出任务不存在"
+
+
+def test_export_job_progress_with_missing_music_ids(client, admin, user_ids, questions, tmp_path):
+    _, music_ids, _ = create_tasks(client, admin, user_ids, questions, tmp_path, 2)
+    # 不存在的音乐 id 不计入总数，完成时进度等于总数
+    response = client.post("/tagging/export/job", headers=admin, json={
+        "music_ids": music_ids + [999999],
+        "format": "json"
+    }).json()
+    assert response["success"], response
+    job = wait_export_job(client, admin, response["data"])
+    assert job["status"] == "succeeded", job
+    assert job["progress"] == job["total"] == 2
+
+
+def test_failed_export_job_removes_temp_file(client, admin, monkeypatch):
+    from app import export_jobs
+    from app.database import SessionLocal
+    from app.models import ExportJob, User
+    from app.schemas import ExportFilter, ExportFormatEnum, ExportJobStatusEnum
+
+    def iter_export(export_filter, export_format, progress=None):
+        yield b"partial"
+        raise RuntimeError("导出失败")
+
+    monkeypatch.setattr(export_jobs, "iter_export", iter_export)
+    with SessionLocal() as db:
+        creator = db.query(User).filter(User.username == "admin").one()
+        job = ExportJob(
+            status=ExportJobStatusEnum.PENDING,
+            format=ExportFormatEnum.JSONL,
+            filters=ExportFilter().model_dump(mode="json"),
+            progress=0,
+            creator_id=creator.id
+        )
+        db.add(job)
+        db.commit()
+        export_jobs.run_export_job(job.id)
+        db.refresh(job)
+        assert job.status == ExportJobStatusEnum.FAILED and job.error == "导出失败"
+        assert not os.path.exists(job.filepath + ".part") and not os.path.exists(job.filepath)
+    assert client.get("/tagging/export/job/file", headers=admin, params={"id": job.id}).json()["error"] == "导出任务尚未完成"
+
+
+def test_export_job_runs_once(client, admin, monkeypatch):
+    from app import export_jobs
+    from app.database import SessionLocal
+    from app.models import ExportJob, User
+    from app.schemas import ExportFilter, ExportFormatEnum, ExportJobStatusEnum
+
+    runs = []
+    count_export_music = export_jobs.count_export_music
+
+    def count_and_rerun(db, export_filter):
+        # 模拟另一个进程在本进程开始执行后提交同一任务
+        if not runs:
+            runs.append("nested")
+            export_jobs.run_export_job(job.id)
+        return count_export_music(db, export_filter)
+
+    def iter_export(export_filter, export_format, progress=None):
+        runs.append("export")
+        yield b""
+
+    monkeypatch.setattr(export_jobs, "count_export_music", count_and_rerun)
+    monkeypatch.setattr(export_jobs, "iter_export", iter_export)
+    with SessionLocal() as db:
+        creator = db.query(User).filter(User.username == "admin").one()
+        job = ExportJob(
+            status=ExportJobStatusEnum.PENDING,
+            format=ExportFormatEnum.JSONL,
+            filters=ExportFilter(music_ids=[]).model_dump(mode="json"),
+            progress=0,
+            creator_id=creator.id
+        )
+        db.add(job)
+        db.commit()
+        export_jobs.run_export_job(job.id)
+        assert runs == ["nested", "export"]
+        db.refresh(job)
+        assert job.status == ExportJobStatusEnum.SUCCEEDED
+
+        # 服务异常退出后遗留的执行中任务可重置为等待执行
+        db.query(ExportJob).filter(ExportJob.id == job.id).update({ExportJob.status: ExportJobStatusEnum.RUNNING, ExportJob.progress: 3})
+        db.commit()
+        assert export_jobs.reset_running_export_jobs(db) >= 1
+        db.refresh(job)
+        assert job.status == ExportJobStatusEnum.PENDING and job.progress == 0
+        db.delete(job)
+        db.commit()
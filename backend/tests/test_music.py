@@ -0,0 +1,383 @@
+import io
+import json
+import os
+import pytest
+import shutil
+import struct
+import time
+import wave
+from helpers import complete_task, create_task, create_wav_files, get_task, import_music, write_wav
+
+
+def list_music(client, **params) -> list[dict]:
+    return client.get("/music/", params=params).json()["data"]
+
+
+def get_music(client, path: str) -> dict:
+    return next(music for music in list_music(client, filepath=path) if music["filepath"] == path)
+
+
+def write_mp3(path: str, frames: int = 100, xing: bool = False):
+    """写入 MPEG1 Layer III 128kbps 44100Hz 立体声帧（帧长 417 字节），可选 Xing 帧数信息"""
+    header = bytes([0xFF, 0xFB, 0x90, 0x00])
+    data = b""
+    if xing:
+        data += header + b"\0" * 32 + b"Xing" + struct.pack(">II", 1, frames * 2) + b"\0" * (413 - 32 - 12)
+    data += (header + b"\0" * 413) * frames
+    id3 = b"ID3\x03\x00\x00" + bytes([0, 0, 0, 20]) + b"\0" * 20
+    with open(path, "wb") as f:
+        f.write(id3 + data)
+
+
+def test_get_music_file_range_and_conditional_requests(client, admin, tmp_path):
+    path = os.path.join(tmp_path, "range.wav")
+    with open(path, "wb") as f:
+        f.write(bytes(range(256)) * 1000)
+    import_music(client, admin, [path])
+
+    response = client.get("/music/file", params={"path": path})
+    assert response.status_code == 200 and len(response.content) == 256000
+    assert response.headers["accept-ranges"] == "bytes"
+    etag = response.headers["etag"]
+
+    response = client.get("/music/file", params={"path": path}, headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206 and response.content == bytes(range(10, 20))
+    assert response.headers["content-range"] == "bytes 10-19/256000"
+    response = client.get("/music/file", params={"path": path}, headers={"Range": "bytes=-5"})
+    assert response.content == bytes(range(251, 256))
+    response = client.get("/music/file", params={"path": path}, headers={"Range": "bytes=999999-"})
+    assert response.status_code == 416
+
+    assert client.get("/music/file", params={"path": path}, headers={"If-None-Match": etag}).status_code == 304
+    response = client.head("/music/file", params={"path": path})
+    assert response.status_code == 200 and response.headers["content-length"] == "256000"
+
+
+def test_parse_range():
+    from app.streaming import parse_range
+
+    assert parse_range("bytes=10-19", 100) == (10, 19)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=90-1000", 100) == (90, 99)
+    assert parse_range("bytes=-5", 100) == (95, 99)
+    assert parse_range("bytes=-500", 100) == (0, 99)
+    # 语法无效或多区间：忽略 Range
+    for header in ["bytes=5-3", "bytes=a-b", "bytes=-", "bytes=1-2,4-5", "items=0-1", "bytes=5"]:
+        assert parse_range(header, 100) is None, header
+    # 语法有效但无法满足
+    for header in ["bytes=100-", "bytes=100-200", "bytes=-0"]:
+        with pytest.raises(ValueError):
+            parse_range(header, 100)
+
+
+def test_get_music_file_invalid_range(client, admin, tmp_path):
+    path = os.path.join(tmp_path, "range.wav")
+    with open(path, "wb") as f:
+        f.write(bytes(range(256)))
+    import_music(client, admin, [path])
+
+    response = client.get("/music/file", params={"path": path}, headers={"Range": "bytes=5-3"})
+    assert response.status_code == 200 and response.content == bytes(range(256))
+    assert "content-range" not in response.headers
+    response = client.get("/music/file", params={"path": path}, headers={"Range": "bytes=256-"})
+    assert response.status_code == 416 and response.headers["content-range"] == "bytes */256"
+
+
+def test_valid_tagging_count(client, admin, tagger, reviewer, user_ids, questions, tmp_path):
+    from app.commands import repair_valid_tagging_count
+    from app.database import SessionLocal
+    from app.models import Music
+
+    paths = create_wav_files(tmp_path, 5)
+    music_ids = import_music(client, admin, paths)
+    task_ids = [
+        create_task(client, admin, music_id, questions, user_ids["tagger"], user_ids["reviewer"])
+        for music_id in music_ids[:2]
+    ]
+    complete_task(client, task_ids[0], tagger, reviewer)
+    complete_task(client, task_ids[1], tagger, reviewer, review_result="disagreed")
+
+    keyword = str(tmp_path)
+    music_list = list_music(client, filepath=keyword, sort_by="valid_tagging_count", sort_order="desc")
+    assert music_list[0]["id"] == music_ids[0] and music_list[0]["valid_tagging_count"] == 1
+    assert [music["id"] for music in list_music(client, filepath=keyword, min_valid_tagging_count=1)] == [music_ids[0]]
+
+    with SessionLocal() as db:
+        db.query(Music).filter(Music.id.in_(music_ids)).update({Music.valid_tagging_count: 7})
+        db.commit()
+        assert repair_valid_tagging_count(db) >= 5
+    assert [music["valid_tagging_count"] for music in list_music(client, filepath=keyword, min_valid_tagging_count=1)] == [1]
+
+    client.post("/tagging/task/operate", headers=admin, json={"operation": "delete", "id": task_ids[0]})
+    assert list_music(client, filepath=keyword, min_valid_tagging_count=1) == []
+
+
+def test_concurrent_review_counts_once(client, admin, tagger, reviewer, user_ids, questions, tmp_path):
+    from app.database import SessionLocal
+    from app.models import Music, TaggingTask, User
+    from app.routers.tagging import review_tagging_task
+    from app.schemas import BizException, ReviewResultEnum, TaggingStatusEnum, TaggingTaskOperate
+
+    (music_id,) = import_music(client, admin, create_wav_files(tmp_path, 1))
+    task_id = create_task(client, admin, music_id, questions, user_ids["tagger"], user_ids["reviewer"])
+    task = get_task(client, task_id)
+    response = client.post("/tagging/tag/batch", headers=tagger, json={
+        "task_id": task_id,
+        "finish": True,
+        "records": [{"id": record["id"], "selected_options": record["question"]["options"][:1]} for record in task["records"]]
+    }).json()
+    assert response["success"], response
+
+    # 模拟两个审核请求并发：本会话已读取到“已打标”的任务，另一个请求先完成审核
+    with SessionLocal(expire_on_commit=False) as db:
+        current_user = db.query(User).filter(User.id == user_ids["reviewer"]).one()
+        stale_task = db.query(TaggingTask).filter(TaggingTask.id == task_id).one()
+        assert stale_task.status == TaggingStatusEnum.TAGGED
+        db.commit()
+        response = client.post("/tagging/task/operate", headers=reviewer, json={
+            "operation": "review",
+            "id": task_id,
+            "review_result": "agreed"
+        }).json()
+        assert response["success"], response
+        operate = TaggingTaskOperate(operation="review", id=task_id, review_result=ReviewResultEnum.AGREED)
+        with pytest.raises(BizException, match="打标任务状态不正确"):
+            review_tagging_task(operate, db, current_user)
+
+    with SessionLocal() as db:
+        assert db.query(Music.valid_tagging_count).filter(Music.id == music_id).scalar() == 1
+
+
+def test_list_music_cursor(client, admin, tmp_path):
+    music_ids = import_music(client, admin, create_wav_files(tmp_path, 5))
+    keyword = str(tmp_path)
+    seen, cursor = [], ""
+    while cursor is not None:
+        data = list_music(client, filepath=keyword, cursor=cursor, page_size=2, sort_by="create_time", sort_order="desc", with_total=True)
+        assert data["total"] == 5 and len(data["items"]) <= 2
+        seen += [music["id"] for music in data["items"]]
+        cursor = data["next_cursor"]
+    assert sorted(seen) == sorted(music_ids) and len(seen) == 5
+    assert not client.get("/music/", params={"cursor": "garbage"}).json()["success"]
+
+
+def test_create_music_from_manifest(client, admin, tmp_path):
+    paths = create_wav_files(tmp_path, 4)
+    manifest = json.dumps(paths[:2] + [paths[0], "/not/exists.wav", "/music.txt", 5])
+    result = client.post("/music/", headers=admin, files={"file": ("music.json", manifest)}).json()["data"]
+    assert result["success_count"] == 2 and result["error_count"] == 3, result
+    assert result["error"] is None
+
+    # JSON Lines：每行为 JSON 字符串或直接为路径
+    body = "\n".join([json.dumps(paths[2]), paths[3], paths[0], ""])
+    lines = [json.loads(line) for line in client.post("/music/ingest", headers=admin, files={"file": ("music.jsonl", body)}).text.splitlines()]
+    assert lines[-1] == {"done": True, "success_count": 2, "error_count": 1}, lines
+
+
+def test_create_music_keeps_committed_batches_on_format_error(client, admin, tmp_path):
+    from app.config import settings
+
+    settings.INGEST_BATCH_SIZE = 2
+    paths = create_wav_files(tmp_path, 3)
+    manifest = "[" + ",".join(json.dumps(path) for path in paths) + ", oops"
+    result = client.post("/music/", headers=admin, files={"file": ("music.json", manifest)}).json()["data"]
+    assert result["error"] == "JSON 文件格式错误"
+    assert result["success_count"] == 2 and len(result["success_ids"]) == 2
+
+    lines = client.post("/music/ingest", headers=admin, files={"file": ("music.json", '["a.wav" x')}).text.splitlines()
+    assert json.loads(lines[-1])["error"] == "JSON 文件格式错误"
+
+
+def test_iter_manifest_paths_across_chunks(monkeypatch):
+    from app import ingest
+
+    monkeypatch.setattr(ingest, "READ_CHUNK_SIZE", 3)
+    data = json.dumps(["中文路径/a.wav", 'b"c.wav', "x"], ensure_ascii=False).encode()
+    assert list(ingest.iter_manifest_paths(io.BytesIO(data))) == ["中文路径/a.wav", 'b"c.wav', "x"]
+    assert list(ingest.iter_manifest_paths(io.BytesIO(b"  []"))) == []
+    assert list(ingest.iter_manifest_paths(io.BytesIO('a.wav\r\n"b.wav"\nc'.encode()))) == ["a.wav", "b.wav", "c"]
+
+
+def scan(client, admin, **params) -> list[dict]:
+    return [json.loads(line) for line in client.post("/music/scan", headers=admin, params=params).text.splitlines()]
+
+
+def test_scan_music(client, admin, tmp_path):
+    from app.config import settings
+
+    assert client.post("/music/scan", headers=admin).json()["error"] == "未配置音乐扫描目录"
+
+    root = os.path.join(tmp_path, "library")
+    os.makedirs(os.path.join(root, "album", "disc"))
+    os.makedirs(os.path.join(root, "album%"))
+    paths = {
+        name: os.path.join(root, name)
+        for name in ["album/1.wav", "album/2.WAV", "album/disc/3.wav", "album%/4.wav", "album_5.wav"]
+    }
+    for path in paths.values():
+        write_wav(path)
+    with open(os.path.join(root, "album", "notes.txt"), "w") as f:
+        f.write("x")
+    settings.MUSIC_SCAN_ROOTS = [root, root + "/"]
+
+    summary = scan(client, admin)[-1]
+    assert summary["success_count"] == 5 and summary["scanned_directories"] == 4, summary
+    # 目录未修改时不再列出文件
+    summary = scan(client, admin)[-1]
+    assert summary["success_count"] == 0 and summary["scanned_directories"] == 0, summary
+
+    # 原地修改文件不改变目录修改时间，全量扫描时更新元数据
+    album = os.path.join(root, "album")
+    album_mtime = os.stat(album).st_mtime
+    write_wav(paths["album/1.wav"], frames=16000)
+    os.utime(album, (album_mtime, album_mtime))
+    assert scan(client, admin)[-1]["updated_count"] == 0
+    summary = scan(client, admin, full=True)[-1]
+    assert summary["updated_count"] == 1 and summary["missing_count"] == 0 and summary["scanned_directories"] == 4, summary
+    assert get_music(client, paths["album/1.wav"])["duration"] == 2
+
+    # 删除文件：清空元数据，不影响路径前缀相同的其他文件
+    os.remove(paths["album/2.WAV"])
+    lines = scan(client, admin)
+    assert lines[-1]["missing_count"] == 1 and lines[0]["missing_paths"] == [paths["album/2.WAV"]], lines
+    assert get_music(client, paths["album/2.WAV"])["file_size"] is None
+    assert get_music(client, paths["album%/4.wav"])["file_size"] is not None
+    assert get_music(client, paths["album_5.wav"])["file_size"] is not None
+    assert scan(client, admin, full=True)[-1]["missing_count"] == 0
+
+    # 文件恢复后重新读取元数据
+    write_wav(paths["album/2.WAV"])
+    assert scan(client, admin)[-1]["updated_count"] == 1
+    assert get_music(client, paths["album/2.WAV"])["file_size"] == os.path.getsize(paths["album/2.WAV"])
+
+    # 删除子目录
+    shutil.rmtree(os.path.join(album, "disc"))
+    assert scan(client, admin)[-1]["missing_count"] == 1
+    assert get_music(client, paths["album/disc/3.wav"])["file_size"] is None
+
+
+def test_read_audio_metadata(tmp_path):
+    from app.audio_metadata import read_audio_metadata, read_audio_metadata_batch
+
+    wav_path = os.path.join(tmp_path, "a.wav")
+    write_wav(wav_path, frames=16000, channels=2)
+    metadata = read_audio_metadata(wav_path)
+    assert metadata["duration"] == 2 and metadata["sample_rate"] == 8000 and metadata["channels"] == 2
+    assert metadata["bitrate"] == 8000 * 2 * 16
+
+    mp3_path = os.path.join(tmp_path, "b.mp3")
+    write_mp3(mp3_path)
+    metadata = read_audio_metadata(mp3_path)
+    assert metadata["sample_rate"] == 44100 and metadata["bitrate"] == 128000 and metadata["channels"] == 2
+    assert abs(metadata["duration"] - 100 * 1152 / 44100) < 0.05
+
+    xing_path = os.path.join(tmp_path, "c.mp3")
+    write_mp3(xing_path, xing=True)
+    assert abs(read_audio_metadata(xing_path)["duration"] - 200 * 1152 / 44100) < 1e-6
+
+    invalid_path = os.path.join(tmp_path, "d.mp3")
+    with open(invalid_path, "wb") as f:
+        f.write(b"garbage")
+    metadata = read_audio_metadata(invalid_path)
+    assert metadata["duration"] is None and metadata["file_size"] == 7
+
+    missing_path = os.path.join(tmp_path, "missing.mp3")
+    assert read_audio_metadata(missing_path) is None
+    paths = [wav_path, missing_path, mp3_path]
+    assert read_audio_metadata_batch(paths) == [read_audio_metadata(path) for path in paths]
+
+
+def test_get_music_file_uses_live_file_state(client, admin, tmp_path):
+    path = os.path.join(tmp_path, "live.wav")
+    write_wav(path, frames=8000)
+    import_music(client, admin, [path])
+    etag = client.get("/music/file", params={"path": path}).headers["etag"]
+
+    # 原地重写为更长的文件：返回完整的新内容并更新元数据
+    write_wav(path, frames=24000)
+    os.utime(path, (1e9, 1e9))
+    response = client.get("/music/file", params={"path": path})
+    assert response.status_code == 200 and response.headers["etag"] != etag
+    assert len(response.content) == int(response.headers["content-length"]) == os.path.getsize(path)
+    music = get_music(client, path)
+    assert music["file_size"] == os.path.getsize(path) and abs(music["duration"] - 3.0) < 0.01
+
+    os.remove(path)
+    assert client.get("/music/file", params={"path": path}).json() == {"success": False, "data": None, "error": "文件不存在"}
+
+
+def test_get_music_file_preview(client, admin, tmp_path):
+    from app import preview
+    from app.config import settings
+
+    paths = []
+    for i in range(3):
+        path = os.path.join(tmp_path, f"preview_{i}.wav")
+        write_wav(path, frames=44100 * 2, channels=2, sample_rate=44100, sample=b"\1\0")
+        paths.append(path)
+    import_music(client, admin, paths)
+
+    response = client.get("/music/file", params={"path": paths[0], "quality": "preview"})
+    assert response.status_code == 200 and response.headers["content-type"] == "audio/wav"
+    with wave.open(io.BytesIO(response.content)) as f:
+        assert f.getnchannels() == 1 and f.getframerate() == 8000
+    assert len(response.content) < os.path.getsize(paths[0]) / 5
+
+    # 超出缓存上限时淘汰最久未使用的预览
+    settings.PREVIEW_CACHE_MAX_BYTES = len(response.content) * 2 + 10
+    for path in [paths[1], paths[0], paths[2]]:
+        time.sleep(0.01)
+        client.get("/music/file", params={"path": path, "quality": "preview"})
+    assert os.path.exists(preview.preview_filepath(paths[0], os.path.getmtime(paths[0])))
+    assert not os.path.exists(preview.preview_filepath(paths[1], os.path.getmtime(paths[1])))
+
+    # 原文件修改后重新生成预览
+    before = client.get("/music/file", params={"path": paths[2], "quality": "preview"}).content
+    write_wav(paths[2], frames=44100 * 8, channels=2, sample_rate=44100, sample=b"\1\0")
+    os.utime(paths[2], (2e9, 2e9))
+    after = client.get("/music/file", params={"path": paths[2], "quality": "preview"}).content
+    assert len(after) > 3 * len(before)
+
+
+def test_preview_survives_eviction(client, admin, tmp_path):
+    from app import preview
+    from app.config import settings
+
+    paths = []
+    for i in range(2):
+        path = os.path.join(tmp_path, f"evict_{i}.wav")
+        write_wav(path, frames=44100, channels=2, sample_rate=44100, sample=b"\2\0")
+        paths.append(path)
+
+    # 返回的预览文件已打开，之后即使被其他请求淘汰删除也能完整读取
+    with preview.get_preview(paths[0], os.path.getmtime(paths[0])) as f:
+        size = os.fstat(f.fileno()).st_size
+        settings.PREVIEW_CACHE_MAX_BYTES = 0
+        preview.get_preview(paths[1], os.path.getmtime(paths[1])).close()
+        assert not os.path.exists(preview.preview_filepath(paths[0], os.path.getmtime(paths[0])))
+        data = f.read()
+    assert len(data) == size > 0
+    with wave.open(io.BytesIO(data)) as wav:
+        assert wav.getnchannels() == 1
+
+
+def test_search_music(client, admin, tmp_path):
+    from app.database import engine
+    from sqlalchemy import text
+
+    paths = create_wav_files(tmp_path, 3, prefix="Search")
+    music_ids = import_music(client, admin, paths)
+    assert [music["filepath"] for music in list_music(client, filepath=paths[1])] == [paths[1]]
+    # 不区分大小写
+    assert len(list_music(client, filepath=str(tmp_path).upper())) == 3
+
+    client.delete("/music/", headers=admin, params={"id": music_ids[0]})
+    assert list_music(client, filepath=paths[0]) == []
+
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            plan = " ".join(str(row) for row in conn.execute(text(
+                "EXPLAIN QUERY PLAN SELECT id FROM music WHERE id IN (SELECT rowid FROM music_fts WHERE filepath LIKE '%Search%')"
+            )))
+            assert "VIRTUAL TABLE INDEX" in plan, plan
+            assert conn.execute(text("SELECT count(*) FROM music_fts WHERE filepath LIKE :path"), {"path": paths[0]}).scalar() == 0
@@ -0,0 +1,207 @@
+import os
+import time
+from collections import Counter
+from helpers import complete_task, count_statements, create_task, create_wav_files, get_task, import_music, login
+
+
+def create_tasks(client, admin, user_ids, questions, tmp_path, count: int) -> tuple[list[int], list[int]]:
+    """导入 count 首音乐（文件名以测试目录名开头，用于按关键词筛选）并各创建一个任务（打标员 tagger，审核员 reviewer），
+    返回 (音乐 id, 任务 id)
+    """
+    music_ids = import_music(client, admin, create_wav_files(tmp_path, count, prefix=tmp_path.name))
+    task_ids = [
+        create_task(client, admin, music_id, questions, user_ids["tagger"], user_ids["reviewer"])
+        for music_id in music_ids
+    ]
+    return music_ids, task_ids
+
+
+def test_list_tagging_task_query_count(client, admin, tagger, reviewer, user_ids, questions, tmp_path):
+    music_ids, task_ids = create_tasks(client, admin, user_ids, questions, tmp_path, 6)
+    complete_task(client, task_ids[0], tagger, reviewer)
+    response, statement_count = count_statements(
+        lambda: client.get("/tagging/task/list", params={"keyword": tmp_path.name, "page_size": 100}).json()
+    )
+    assert statement_count <= 5
+    items = response["data"]["items"]
+    assert response["data"]["total"] == 6 and len(items) == 6
+    assert sum(task["music"]["valid_tagging_count"] for task in items) == 1
+
+
+def test_list_tagging_task_cursor(client, admin, user_ids, questions, tmp_path):
+    create_tasks(client, admin, user_ids, questions, tmp_path, 7)
+    params = {"keyword": tmp_path.name, "tagger_id": user_ids["tagger"]}
+    seen, cursor = [], ""
+    while cursor is not None:
+        data = client.get("/tagging/task/list", params={**params, "cursor": cursor, "page_size": 3, "with_total": True}).json()["data"]
+        seen += [task["id"] for task in data["items"]]
+        cursor = data["next_cursor"]
+    full = client.get("/tagging/task/list", params={**params, "page_size": 100}).json()["data"]
+    assert seen == [task["id"] for task in full["items"]] and data["total"] == full["total"] == 7
+
+
+def test_batch_tag(client, admin, tagger, user_ids, questions, tmp_path):
+    _, (task_id,) = create_tasks(client, admin, user_ids, questions, tmp_path, 1)
+    records = get_task(client, task_id)["records"]
+    single = next(record for record in records if not record["question"]["is_multiple_choice"])
+
+    def batch_tag(records, finish=False):
+        return client.post("/tagging/tag/batch", headers=tagger, json={"task_id": task_id, "finish": finish, "records": records}).json()
+
+    assert batch_tag([{"id": single["id"], "selected_options": ["a", "b"]}])["error"] == "打标选项只能选择一个"
+    assert batch_tag([{"id": 999999, "selected_options": ["a"]}])["error"] == "打标记录不存在"
+    response = batch_tag([{"id": record["id"], "selected_options": record["question"]["options"][1:2]} for record in records], finish=True)
+    assert response["success"], response
+    task = get_task(client, task_id)
+    assert task["status"] == "tagged" and all(record["selected_options"] for record in task["records"])
+
+
+def test_bulk_create_tagging_task(client, admin, user_ids, questions, tmp_path):
+    login(client, "bulk_tagger_1", "tagger")
+    login(client, "bulk_tagger_2", "tagger")
+    users = {user["username"]: user["id"] for user in client.get("/user/list").json()["data"]}
+    taggers = [users["tagger"], users["bulk_tagger_1"], users["bulk_tagger_2"]]
+    music_ids = import_music(client, admin, create_wav_files(tmp_path, 6))
+
+    def bulk_create(**values):
+        return client.post("/tagging/task/bulk_create", headers=admin, json={
+            "question_ids": questions,
+            "tagger_ids": taggers,
+            "reviewer_ids": [users["reviewer"]],
+            **values
+        }).json()
+
+    response = bulk_create(filepath_prefix=os.path.join(tmp_path, ""), redundancy=2)
+    assert response["success"], response
+    assert response["data"]["created_count"] == 12
+    tasks = [get_task(client, task_id) for task_id in response["data"]["task_ids"]]
+    assert Counter(task["tagger"]["id"] for task in tasks) == Counter({tagger_id: 4 for tagger_id in taggers})
+    assert all(len(task["records"]) == len(questions) for task in tasks)
+    assert max(Counter((task["music"]["id"], task["tagger"]["id"]) for task in tasks).values()) == 1
+
+    response = bulk_create(music_ids=[music_ids[0]], policy="least_loaded")
+    task = get_task(client, response["data"]["task_ids"][0])
+    assert task["tagger"]["id"] in (users["bulk_tagger_1"], users["bulk_tagger_2"])
+    assert bulk_create(music_ids=[999999])["error"] == "音乐不存在"
+
+
+def test_list_next_tagging_task_warms_previews(client, admin, user_ids, questions, tmp_path):
+    from app import preview
+
+    next_tagger = login(client, "next_tagger", "tagger")
+    tagger_id = client.get("/user/", headers=next_tagger).json()["data"]["id"]
+    paths = create_wav_files(tmp_path, 4)
+    for music_id in import_music(client, admin, paths):
+        create_task(client, admin, music_id, questions, tagger_id, user_ids["reviewer"])
+
+    tasks = client.get("/tagging/task/next", headers=next_tagger, params={"limit": 2}).json()["data"]
+    assert [task["music"]["filepath"] for task in tasks] == paths[:2]
+    tasks = client.get("/tagging/task/next", headers=next_tagger, params={"limit": 5, "exclude_task_id": tasks[0]["id"]}).json()["data"]
+    assert [task["music"]["filepath"] for task in tasks] == paths[1:]
+
+    preview_paths = [preview.preview_filepath(path, os.path.getmtime(path)) for path in paths[1:]]
+    for _ in range(100):
+        if all(os.path.exists(path) for path in preview_paths):
+            break
+        time.sleep(0.05)
+    assert all(os.path.exists(path) for path in preview_paths)
+
+
+def test_list_tagging_question_etag(client, admin, questions):
+    response = client.get("/tagging/question/list")
+    assert {"测试单选题", "测试多选题"} <= {question["title"] for question in response.json()["data"]}
+    etag = response.headers["etag"]
+    response = client.get("/tagging/question/list", headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.headers["etag"] == etag
+
+    client.post("/tagging/question/operate", headers=admin, json={"operation": "update", "id": questions[0], "description": "已修改"})
+    response = client.get("/tagging/question/list", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["etag"] != etag
+    assert "已修改" in [question["description"] for question in response.json()["data"]]
+
+
+def test_list_tagging_task_compact_view(client, admin, user_ids, questions, tmp_path):
+    create_tasks(client, admin, user_ids, questions, tmp_path, 3)
+    params = {"keyword": tmp_path.name, "page_size": 100}
+    full = client.get("/tagging/task/list", params=params).json()["data"]
+    compact = client.get("/tagging/task/list", params={**params, "view": "compact"}).json()["data"]
+    assert compact["total"] == full["total"]
+    assert [task["id"] for task in compact["items"]] == [task["id"] for task in full["items"]]
+
+    music = {item["id"]: item for item in compact["music"]}
+    users = {item["id"]: item for item in compact["users"]}
+    question_map = {item["id"]: item for item in compact["questions"]}
+    assert len(users) == len(compact["users"]) and len(question_map) == len(compact["questions"])
+    for full_task, compact_task in zip(full["items"], compact["items"]):
+        assert music[compact_task["music_id"]] == full_task["music"]
+        assert users[compact_task["tagger_id"]] == full_task["tagger"]
+        assert users[compact_task["creator_id"]] == full_task["creator"]
+        full_records = {record["id"]: record for record in full_task["records"]}
+        assert len(full_records) == len(compact_task["records"])
+        for compact_record in compact_task["records"]:
+            full_record = full_records[compact_record["id"]]
+            assert question_map[compact_record["question_id"]] == full_record["question"]
+            assert compact_record["selected_options"] == full_record["selected_options"]
+
+    data = client.get("/tagging/task/list", params={**params, "cursor": "", "page_size": 2, "view": "compact"}).json()["data"]
+    assert len(data["items"]) == 2 and data["next_cursor"] and "questions" in data
+
+
+def get_analytics(client, admin) -> tuple[dict, dict]:
+    """统计与一致率，并检查增量维护的结果与重建结果一致"""
+    from app.analytics import rebuild_analytics
+    from app.database import SessionLocal
+
+    def fetch():
+        return (
+            client.get("/tagging/analytics", headers=admin).json()["data"],
+            client.get("/tagging/analytics/agreement", headers=admin, params={"min_tagger_count": 1, "page_size": 100}).json()["data"]
+        )
+
+    incremental = fetch()
+    with SessionLocal() as db:
+        rebuild_analytics(db)
+        db.commit()
+    assert fetch() == incremental
+    return incremental
+
+
+def test_analytics(client, admin, tagger, reviewer, user_ids, tmp_path):
+    second_tagger = login(client, "analytics_tagger", "tagger")
+    second_tagger_id = client.get("/user/", headers=second_tagger).json()["data"]["id"]
+    assert not client.get("/tagging/analytics", headers=tagger).json()["success"]
+
+    questions = [
+        client.post("/tagging/question/operate", headers=admin, json={
+            "operation": "create", "title": title, "description": "", "is_multiple_choice": False, "options": ["a", "b"]
+        }).json()["data"]
+        for title in ["统计题目 1", "统计题目 2"]
+    ]
+    (music_id,) = import_music(client, admin, create_wav_files(tmp_path, 1))
+    first_task = create_task(client, admin, music_id, questions, user_ids["tagger"], user_ids["reviewer"])
+    second_task = create_task(client, admin, music_id, questions, second_tagger_id, user_ids["reviewer"])
+    complete_task(client, first_task, tagger, reviewer, option_index=0)
+    complete_task(client, second_task, second_tagger, reviewer, option_index=1)
+
+    stats, agreement = get_analytics(client, admin)
+    option_counts = {
+        question["question_id"]: {option["option"]: option["count"] for option in question["options"]}
+        for question in stats["questions"]
+    }
+    assert option_counts[questions[0]] == {"a": 1, "b": 1}
+    assert {tagger["username"]: tagger["reviewed_count"] for tagger in stats["taggers"]}["analytics_tagger"] == 1
+    item = next(item for item in agreement["items"] if item["music_id"] == music_id)
+    assert item["tagger_count"] == 2 and item["agreement"] == 0.5
+    assert {question["question_id"]: question["agreement"] for question in item["questions"]} == {questions[0]: 0.5, questions[1]: 0.5}
+    assert any(item["music_id"] == music_id for item in client.get("/tagging/analytics/agreement", headers=reviewer).json()["data"]["items"])
+
+    # 删除任务 / 题目 / 音乐时扣减统计
+    client.post("/tagging/task/operate", headers=admin, json={"operation": "delete", "id": second_task})
+    _, agreement = get_analytics(client, admin)
+    item = next(item for item in agreement["items"] if item["music_id"] == music_id)
+    assert item["tagger_count"] == 1 and item["agreement"] == 1.0
+    client.post("/tagging/question/operate", headers=admin, json={"operation": "delete", "id": questions[0]})
+    get_analytics(client, admin)
+    client.delete("/music/", headers=admin, params={"id": music_id})
+    _, agreement = get_analytics(client, admin)
+    assert not any(item["music_id"] == music_id for item in agreement["items"])
@@ -0,0 +1,31 @@
+from helpers import count_statements, login
+
+
+def test_register_and_login(client):
+    headers = login(client, "user_test", "tagger")
+    user = client.get("/user/", headers=headers).json()["data"]
+    assert user["username"] == "user_test" and user["role"] == "tagger"
+    assert client.post("/user/register", json={"username": "user_test", "password": "password", "role": "tagger"}).json()["error"] == "用户已存在"
+    assert client.post("/user/login", json={"username": "user_test", "password": "wrong"}).json()["error"] == "密码错误"
+    assert client.post("/user/login", json={"username": "user_missing", "password": "password"}).json()["error"] == "用户不存在"
+    assert [item["username"] for item in client.get("/user/list", params={"keyword": "user_test"}).json()["data"]] == ["user_test"]
+
+
+def test_principal_cache(client):
+    from app.auth import invalidate_principal_cache
+
+    headers = login(client, "principal_test", "reviewer")
+    user_id = client.get("/user/", headers=headers).json()["data"]["id"]
+
+    # 命中缓存时不访问数据库
+    response, statement_count = count_statements(lambda: client.get("/user/", headers=headers).json())
+    assert response["data"]["id"] == user_id and statement_count == 0
+
+    invalidate_principal_cache(user_id)
+    response, statement_count = count_statements(lambda: client.get("/user/", headers=headers).json())
+    assert response["data"]["id"] == user_id and statement_count > 0
+    invalidate_principal_cache()
+    _, statement_count = count_statements(lambda: client.get("/user/", headers=headers).json())
+    assert statement_count > 0
+
+    assert client.get("/user/", headers={"Authorization": "Bearer invalid"}).json()["error"] == "无效的 token"
@@ -1,19 +1,21 @@
 /**
  * 音乐相关 API
  */
-import api from './index'
+import api, { API_BASE_URL } from './index'
 import type { ApiResponse, MusicResponse } from '../types/interfaces'
 
 /**
  * 通过 JSON 文件上传音乐路径信息
  * JSON 文件格式：字符串数组，每个字符串是音乐文件的路径
  * 例如：["/path/to/music1.mp3", "/path/to/music2.wav"]
+ * 也支持 JSON Lines 格式：每行一个路径
  */
 export const createMusic = async (file: File): Promise<ApiResponse<{
   success_count: number
   error_count: number
   success_ids: number[]
   error_paths: string[]
+  error: string | null  // 清单中途格式错误时的错误信息（之前的批次已导入）
 }>> => {
   const formData = new FormData()
   formData.append('file', file)
@@ -36,6 +38,10 @@ export const deleteMusic = async (id: number): Promise<ApiResponse> => {
  */
 export const getMusicList = async (params?: {
   filepath?: string
+  min_valid_tagging_count?: number
+  max_valid_tagging_count?: number
+  sort_by?: 'filename' | 'valid_tagging_count' | 'create_time'
+  sort_order?: 'asc' | 'desc'
   page?: number
   page_size?: number
 }): Promise<ApiResponse<{
@@ -61,3 +67,11 @@ export const getAllMusicList = async (filepath?: string): Promise<ApiResponse<Mu
   return response.data
 }
 
+/**
+ * 获取音乐文件的播放地址
+ * 直接作为 <audio> 的 src 使用，浏览器会通过 Range 分段请求，支持边下边播和拖动进度
+ * quality 为 preview 时 WAV 文件返回低码率预览版本
+ */
+export const getMusicFileUrl = (filepath: string, quality: 'original' | 'preview' = 'original'): string => {
+  return `${API_BASE_URL}/music/file?path=${encodeURIComponent(filepath)}&quality=${quality}`
+}
@@ -9,12 +9,19 @@ import type {
   TaggingQuestionResponse,
   TaggingTaskOperate,
   TaggingTaskResponse,
+  TaggingTaskCompactResponse,
   TaggingRecordUpdate,
+  TaggingRecordBatchUpdate,
   TaggingItemResponse,
   TaggingItemCreate,
   TaggingRecordResponse,
   TaggingRecordOperate,
-  TaggingRecordReview
+  TaggingRecordReview,
+  MusicResponse,
+  UserResponse,
+  QuestionStatResponse,
+  TaggerStatResponse,
+  MusicAgreementResponse
 } from '../types/interfaces'
 import { OperationEnum, TaggingStatusEnum, ReviewResultEnum } from '../types/enums'
 
@@ -62,6 +69,42 @@ export const getTaggingTaskList = async (params?: {
   return response.data
 }
 
+/**
+ * 获取打标任务列表（分页，精简格式）
+ * 任务中只包含 id，音乐、用户与题目在去重后的附表中返回
+ */
+export const getCompactTaggingTaskList = async (params?: {
+  keyword?: string
+  status?: TaggingStatusEnum
+  tagger_id?: number
+  reviewer_id?: number
+  page?: number
+  page_size?: number
+}): Promise<ApiResponse<{
+  items: TaggingTaskCompactResponse[]
+  music: MusicResponse[]
+  users: UserResponse[]
+  questions: TaggingQuestionResponse[]
+  total: number
+  page: number
+  page_size: number
+}>> => {
+  const response = await api.get('/tagging/task/list', { params: { ...params, view: 'compact' } })
+  return response.data
+}
+
+/**
+ * 获取当前用户接下来要打标的任务（用于预取音频）
+ * 服务端会同时在后台预热这些任务的音乐文件
+ */
+export const getNextTaggingTasks = async (params?: {
+  limit?: number
+  exclude_task_id?: number
+}): Promise<ApiResponse<TaggingTaskResponse[]>> => {
+  const response = await api.get('/tagging/task/next', { params })
+  return response.data
+}
+
 /**
  * 打标（更新打标记录）
  */
@@ -70,6 +113,14 @@ export const tagMusic = async (data: TaggingRecordUpdate): Promise<ApiResponse>
   return response.data
 }
 
+/**
+ * 批量打标（一次提交任务下多条打标记录，可同时完成打标任务）
+ */
+export const batchTagMusic = async (data: TaggingRecordBatchUpdate): Promise<ApiResponse> => {
+  const response = await api.post('/tagging/tag/batch', data)
+  return response.data
+}
+
 /**
  * 获取打标项列表（兼容旧接口，实际使用 TaggingQuestion）
  */
@@ -201,9 +252,13 @@ export const reviewTaggingRecord = async (data: TaggingRecordReview): Promise<Ap
 }
 
 /**
- * 下载打标记录（JSON文件）
+ * 下载打标记录
+ * format: json（默认，嵌套 JSON）/ jsonl / csv / columnar（列式，选项编码为下标）
  */
-export const downloadTaggingRecords = async (musicIds: number[]): Promise<Blob> => {
+export const downloadTaggingRecords = async (
+  musicIds: number[],
+  format: 'json' | 'jsonl' | 'csv' | 'columnar' = 'json'
+): Promise<Blob> => {
   const token = localStorage.getItem('token')
   // FastAPI 期望多个同名查询参数 music_ids=1&music_ids=2
   // 使用 URLSearchParams 构建查询字符串
@@ -211,6 +266,7 @@ export const downloadTaggingRecords = async (musicIds: number[]): Promise<Blob>
   musicIds.forEach(id => {
     params.append('music_ids', id.toString())
   })
+  params.append('format', format)
   
   try {
     const response = await axios.get(`${API_BASE_URL}/tagging/download?${params.toString()}`, {
@@ -238,3 +294,31 @@ export const downloadTaggingRecords = async (musicIds: number[]): Promise<Blob>
   }
 }
 
+
+/**
+ * 获取标注统计（各题目选项次数、各打标员已审核通过任务数）
+ */
+export const getTaggingAnalytics = async (): Promise<ApiResponse<{
+  questions: QuestionStatResponse[]
+  taggers: TaggerStatResponse[]
+}>> => {
+  const response = await api.get('/tagging/analytics')
+  return response.data
+}
+
+/**
+ * 获取音乐打标一致率（按一致率从低到高分页）
+ */
+export const getMusicAgreementList = async (params?: {
+  page?: number
+  page_size?: number
+  min_tagger_count?: number
+}): Promise<ApiResponse<{
+  items: MusicAgreementResponse[]
+  total: number
+  page: number
+  page_size: number
+}>> => {
+  const response = await api.get('/tagging/analytics/agreement', { params })
+  return response.data
+}
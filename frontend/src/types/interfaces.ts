@@ -41,6 +41,11 @@ export interface MusicResponse {
   filepath: string
   filename: string
   valid_tagging_count: number
+  file_size?: number | null
+  duration?: number | null
+  sample_rate?: number | null
+  channels?: number | null
+  bitrate?: number | null
   create_time: string
 }
 
@@ -116,8 +121,15 @@ export interface TaggingRecordUpdate {
   selected_options: string[]
 }
 
+export interface TaggingRecordBatchUpdate {
+  task_id: number
+  records: TaggingRecordUpdate[]
+  finish?: boolean
+}
+
 export interface TaggingRecordResponse {
   id: number
+  question_id: number
   question: TaggingQuestionResponse
   selected_options: string[]
 }
@@ -135,3 +147,55 @@ export interface TaggingTaskResponse {
   records: TaggingRecordResponse[]
 }
 
+export interface TaggingRecordCompactResponse {
+  id: number
+  question_id: number
+  selected_options: string[]
+}
+
+// 精简格式的打标任务，音乐、用户与题目通过 id 引用列表附表
+export interface TaggingTaskCompactResponse {
+  id: number
+  music_id: number
+  status: TaggingStatusEnum
+  tagger_id: number
+  tagging_time?: string
+  reviewer_id?: number
+  review_time?: string
+  creator_id: number
+  create_time: string
+  records: TaggingRecordCompactResponse[]
+}
+
+
+// 标注统计（只统计已审核通过的任务）
+export interface OptionCountResponse {
+  option: string
+  count: number
+}
+
+export interface QuestionStatResponse {
+  question_id: number
+  title: string
+  options: OptionCountResponse[]
+}
+
+export interface TaggerStatResponse {
+  tagger_id: number
+  username?: string
+  reviewed_count: number
+}
+
+export interface QuestionAgreementResponse {
+  question_id: number
+  agreement: number
+  answer: string[]
+}
+
+export interface MusicAgreementResponse {
+  music_id: number
+  filepath?: string
+  tagger_count: number
+  agreement: number
+  questions: QuestionAgreementResponse[]
+}